@@ -0,0 +1,163 @@
+import hashlib
+import os
+import threading
+import time
+import wave
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Dict, List, Optional
+
+import numpy as np
+from cachetools import LRUCache
+
+from scheduler import Priority
+
+# Every segment is resampled to this rate before it is joined with others
+SAMPLE_RATE = 22050
+# Silence inserted between segments, and fade applied to each segment's edges to avoid clicks
+SEGMENT_GAP_SECONDS = 0.15
+FADE_SECONDS = 0.01
+# Samples quieter than this (fraction of full scale) at a segment's edges are trimmed
+TRIM_THRESHOLD = 0.01
+
+# Synthesized samples per (voice, segment text), shared across sessions
+_segment_cache = LRUCache(maxsize=512)
+_segment_cache_lock = threading.Lock()
+
+
+class SegmentComposer:
+    """
+    Builds spoken responses from separately synthesized segments. Template phrases and
+    product names are cached on their own, so a new response usually only needs speech
+    for product names that haven't been heard before; the clip is assembled locally.
+
+    Attributes:
+        - voice_interface: VoiceInterface whose TTS router synthesizes missing segments
+        - stats: Optional PrefetchStats that segment cache hits are recorded in
+    """
+    _executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="segments")
+
+    def __init__(self, voice_interface, stats=None):
+        self.voice_interface = voice_interface
+        self.stats = stats
+
+    def _key(self, text: str, voice_id: Optional[str] = None) -> tuple:
+        return voice_id or self.voice_interface.voice_id, text
+
+    def is_cached(self, text: str, voice_id: Optional[str] = None) -> bool:
+        with _segment_cache_lock:
+            return self._key(text, voice_id) in _segment_cache
+
+    def _synthesize_segment(self, text: str, timeout: float, priority: Priority) -> str:
+        """Synthesizes and caches one segment, returning the voice of the backend that answered."""
+        backend, (samples, rate) = self.voice_interface.tts.call_with_backend(
+            "synthesize_pcm", text, timeout=timeout, priority=priority)
+        samples = self._prepare(samples, rate)
+        with _segment_cache_lock:
+            _segment_cache[self._key(text, backend.voice_id)] = samples
+        return backend.voice_id
+
+    @staticmethod
+    def _prepare(samples: np.ndarray, rate: int) -> np.ndarray:
+        """Resamples a segment to SAMPLE_RATE, trims its silent edges and fades them in and out."""
+        audio = samples.astype(np.float32) / 32768
+        if rate != SAMPLE_RATE and len(audio):
+            positions = np.arange(int(len(audio) * SAMPLE_RATE / rate)) * rate / SAMPLE_RATE
+            audio = np.interp(positions, np.arange(len(audio)), audio).astype(np.float32)
+
+        loud = np.flatnonzero(np.abs(audio) >= TRIM_THRESHOLD)
+        if len(loud):
+            audio = audio[loud[0]:loud[-1] + 1]
+
+        fade = min(int(FADE_SECONDS * SAMPLE_RATE), len(audio) // 2)
+        if fade:
+            ramp = np.linspace(0.0, 1.0, fade, dtype=np.float32)
+            audio[:fade] *= ramp
+            audio[-fade:] *= ramp[::-1]
+        return audio
+
+    def warm(self, segments: List[str], timeout: float, priority: Priority = Priority.INTERACTIVE,
+             voice_id: Optional[str] = None) -> List[str]:
+        """
+        Synthesizes every segment that isn't cached yet, concurrently.
+
+        Args:
+            segments (List[str]): Segment texts
+            timeout (float): Seconds synthesis of all segments may take
+            priority (Priority): Admission priority against other sessions' provider calls
+            voice_id (Optional[str]): Voice the segments must be in, the primary backend's by default
+
+        Returns:
+            List[str]: Segments that still aren't available in that voice
+        """
+        voice_id = voice_id or self.voice_interface.voice_id
+        missing = [text for text in dict.fromkeys(segments) if not self.is_cached(text, voice_id)]
+        if not missing:
+            return []
+
+        futures = {self._executor.submit(self._synthesize_segment, text, timeout, priority): text for text in missing}
+        done, _ = wait(futures, timeout=timeout)
+        failed = []
+        for future, text in futures.items():
+            if future not in done or future.exception() is not None:
+                print(f"Error synthesizing segment '{text}': {future.exception() if future in done else 'timed out'}")
+                failed.append(text)
+            elif future.result() != voice_id:
+                # A failover backend answered; its segment can't be joined with ones in the requested voice
+                failed.append(text)
+        return failed
+
+    def _fallback(self, text: str, deadline: float) -> Optional[str]:
+        """Synthesizes the whole response in one piece with whatever time is left."""
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return self.voice_interface.cached_speech(text)
+        return self.voice_interface.text_to_speech(text, timeout=remaining)
+
+    def compose(self, segments: List[str], fallback_text: str, timeout: float) -> Optional[str]:
+        """
+        Converts a segmented response to speech, reusing cached segments.
+
+        Args:
+            segments (List[str]): Segment texts in playback order
+            fallback_text (str): The same response as one sentence, spoken if segments are missing
+            timeout (float): Seconds the whole call may take, including the fallback
+
+        Returns:
+            Optional[str]: Path to the composed wav file, or whatever text_to_speech returns for
+                ``fallback_text`` if some segments couldn't be synthesized
+        """
+        deadline = time.monotonic() + timeout
+        # Every segment of one clip must come from the same voice
+        voice_id = self.voice_interface.voice_id
+        digest = hashlib.sha1("\n".join([voice_id, *segments]).encode("utf-8")).hexdigest()[:16]
+        composed_path = os.path.join(self.voice_interface.recordings_dir, f"tts_composed_{digest}.wav")
+        if self.stats is not None:
+            composed = os.path.exists(composed_path)
+            for text in segments:
+                self.stats.record_lookup("segment", composed or self.is_cached(text, voice_id))
+        if os.path.exists(composed_path):
+            return composed_path
+
+        if self.warm(segments, timeout, voice_id=voice_id):
+            return self._fallback(fallback_text, deadline)
+
+        with _segment_cache_lock:
+            clips: Dict[str, np.ndarray] = {text: _segment_cache.get(self._key(text, voice_id)) for text in segments}
+        if any(clip is None for clip in clips.values()):
+            return self._fallback(fallback_text, deadline)
+
+        gap = np.zeros(int(SEGMENT_GAP_SECONDS * SAMPLE_RATE), dtype=np.float32)
+        pieces = []
+        for text in segments:
+            pieces += [clips[text], gap]
+        audio = np.concatenate(pieces[:-1]) if pieces else gap
+
+        # Write under a private name first so concurrent sessions never read a half-written clip
+        partial_path = f"{composed_path}.{threading.get_ident()}.part"
+        with wave.open(partial_path, "wb") as wav_file:
+            wav_file.setnchannels(1)
+            wav_file.setsampwidth(2)
+            wav_file.setframerate(SAMPLE_RATE)
+            wav_file.writeframes((np.clip(audio, -1.0, 1.0) * 32767).astype("<i2").tobytes())
+        os.replace(partial_path, composed_path)
+        return composed_path
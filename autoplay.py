@@ -1,7 +1,13 @@
 import streamlit as st
 import base64
+import os
 import time
 
+AUDIO_MIME_TYPES = {
+    ".mp3": "audio/mp3",
+    ".wav": "audio/wav",
+}
+
 def autoplay_audio(file_path: str):
     """
     Automatically plays an audio file in Streamlit using HTML/JavaScript
@@ -12,10 +18,11 @@ def autoplay_audio(file_path: str):
     with open(file_path, "rb") as f:
         data = f.read()
         b64 = base64.b64encode(data).decode()
+    mime_type = AUDIO_MIME_TYPES.get(os.path.splitext(file_path)[1].lower(), "audio/mp3")
         
     md = f"""
         <audio id="myAudio" autoplay="true">
-            <source src="data:audio/mp3;base64,{b64}" type="audio/mp3">
+            <source src="data:{mime_type};base64,{b64}" type="{mime_type}">
         </audio>
         <script>
             // Function to handle audio error
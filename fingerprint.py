@@ -0,0 +1,44 @@
+import hashlib
+import threading
+from typing import Optional
+
+from cachetools import LRUCache
+
+# Bytes hashed per update, so large recordings are digested without extra copies
+CHUNK_SIZE = 64 * 1024
+
+
+def fingerprint(data: bytes) -> str:
+    """
+    Computes a content hash of a recording by streaming it through BLAKE2b in chunks.
+
+    Args:
+        data (bytes): Recording contents
+
+    Returns:
+        str: Hex digest identifying the recording
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    view = memoryview(data)
+    for start in range(0, len(view), CHUNK_SIZE):
+        digest.update(view[start:start + CHUNK_SIZE])
+    return digest.hexdigest()
+
+
+class TranscriptCache:
+    """
+    Process-wide digest -> transcript cache, so a recording submitted twice (widget replays,
+    double clicks, reconnects) is only transcribed once.
+    """
+    _cache = LRUCache(maxsize=2048)
+    _lock = threading.Lock()
+
+    @classmethod
+    def get(cls, digest: str) -> Optional[str]:
+        with cls._lock:
+            return cls._cache.get(digest)
+
+    @classmethod
+    def put(cls, digest: str, transcript: str):
+        with cls._lock:
+            cls._cache[digest] = transcript
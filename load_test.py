@@ -0,0 +1,391 @@
+import argparse
+import hashlib
+import io
+import json
+import os
+import statistics
+import tempfile
+import threading
+import time
+import tracemalloc
+import wave
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Union
+from unittest import mock
+
+import st_audiorec
+import autoplay
+from streamlit.runtime import Runtime
+from streamlit.runtime.caching.storage.dummy_cache_storage import MemoryCacheStorageManager
+from streamlit.runtime.media_file_manager import MediaFileManager
+from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage
+from streamlit.runtime.secrets import Secrets
+from streamlit.testing.v1 import AppTest
+from prefetch import SpeculativePrefetcher
+from scheduler import get_scheduler
+from providers import FakeLLM, FakeSTT, FakeTTS, register_backend
+
+# Session state key the fake recorder widget reads the next utterance from
+AUDIO_STATE_KEY = "_load_test_audio"
+
+FAKE_SECRETS = {
+    "ASSEMBLYAI_API_KEY": "load-test",
+    "ELEVENLABS_API_KEY": "load-test",
+    "OPENAI_API_KEY": "load-test",
+    "API_ENDPOINT": "http://load-test.invalid",
+    "STT_BACKENDS": "fake",
+    "TTS_BACKENDS": "fake",
+    "LLM_BACKENDS": "fake",
+}
+
+DEFAULT_UTTERANCES = [
+    {"transcript": "Can you recommend me something similar to milk?", "item": "milk"},
+    {"transcript": "I am looking for brown bread", "item": "brown bread"},
+    {"transcript": "I need eggs, butter and jam", "item": ["eggs", "butter", "jam"]},
+    {"transcript": "Yes, please place the order", "item": None},
+]
+
+
+@dataclass
+class Utterance:
+    audio: bytes
+    transcript: str
+    item: Optional[Union[str, List[str]]]
+
+    @property
+    def digest(self) -> str:
+        return hashlib.sha1(self.audio).hexdigest()
+
+
+@dataclass
+class LevelReport:
+    concurrency: int
+    sessions: int
+    wall_time: float
+    rerun_latencies: List[float] = field(default_factory=list)
+    peak_threads: int = 0
+    memory_per_session: float = 0.0
+    errors: int = 0
+
+    @property
+    def sessions_per_sec(self) -> float:
+        return self.sessions / self.wall_time if self.wall_time else 0.0
+
+    def percentile(self, pct: float) -> float:
+        if not self.rerun_latencies:
+            return 0.0
+        ordered = sorted(self.rerun_latencies)
+        index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+    def to_dict(self) -> dict:
+        return {
+            "concurrency": self.concurrency,
+            "sessions": self.sessions,
+            "errors": self.errors,
+            "sessions_per_sec": round(self.sessions_per_sec, 3),
+            "rerun_p50_ms": round(self.percentile(50) * 1000, 1),
+            "rerun_p95_ms": round(self.percentile(95) * 1000, 1),
+            "rerun_max_ms": round(max(self.rerun_latencies, default=0.0) * 1000, 1),
+            "rerun_mean_ms": round(statistics.fmean(self.rerun_latencies) * 1000, 1) if self.rerun_latencies else 0.0,
+            "peak_threads": self.peak_threads,
+            "memory_per_session_kb": round(self.memory_per_session / 1024, 1),
+        }
+
+
+def silent_wav(seconds: float = 1.0, rate: int = 16000, seed: int = 0) -> bytes:
+    """
+    Builds a short silent WAV clip, used when no recorded utterances are supplied.
+
+    Args:
+        seconds (float): Clip length in seconds
+        rate (int): Sample rate of the clip
+        seed (int): Value written into the first sample so every clip hashes differently
+
+    Returns:
+        bytes: WAV file contents
+    """
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(rate)
+        frames = bytearray(int(seconds * rate) * 2)
+        frames[0:2] = seed.to_bytes(2, "little")
+        wav_file.writeframes(bytes(frames))
+    return buffer.getvalue()
+
+
+def load_utterances(manifest_path: Optional[str]) -> List[Utterance]:
+    """
+    Loads recorded utterances from a JSON manifest.
+
+    The manifest is a list of objects with an ``audio`` path (relative to the manifest),
+    the ``transcript`` the fake transcriber should return and the ``item`` (a name or a
+    list of names) the fake extractor should return (or null for order-intent turns).
+
+    Args:
+        manifest_path (Optional[str]): Path to the manifest, or None for built-in utterances
+
+    Returns:
+        List[Utterance]: Utterances to replay in every simulated session
+    """
+    if not manifest_path:
+        return [
+            Utterance(silent_wav(seed=index), entry["transcript"], entry["item"])
+            for index, entry in enumerate(DEFAULT_UTTERANCES)
+        ]
+
+    base_dir = os.path.dirname(os.path.abspath(manifest_path))
+    with open(manifest_path) as f:
+        entries = json.load(f)
+
+    utterances = []
+    for entry in entries:
+        with open(os.path.join(base_dir, entry["audio"]), "rb") as audio_file:
+            utterances.append(Utterance(audio_file.read(), entry["transcript"], entry.get("item")))
+    return utterances
+
+
+class ProviderMocks:
+    """
+    Replaces every external call made by the app with local fakes that sleep for a
+    configurable latency, so load tests exercise the app and not the vendors. Speech and
+    language calls go through the fake provider backends; the recommender API is patched.
+    """
+    def __init__(self, utterances: List[Utterance], latencies: Dict[str, float], playback_sleep: bool):
+        self.latencies = latencies
+        self.playback_sleep = playback_sleep
+        self.transcripts = {u.digest: u.transcript for u in utterances}
+        self.items = {u.transcript: u.item for u in utterances}
+        self._patches = []
+
+    def _sleep(self, stage: str):
+        delay = self.latencies.get(stage, 0.0)
+        if delay:
+            time.sleep(delay)
+
+    def lookup_transcript(self, audio_path: str) -> Optional[str]:
+        with open(audio_path, "rb") as f:
+            return self.transcripts.get(hashlib.sha1(f.read()).hexdigest())
+
+    def respond(self, system: str, prompt: str) -> str:
+        if "extracts item names" not in system:
+            return "yes"
+        for transcript, item in self.items.items():
+            if transcript in prompt:
+                if not item:
+                    return "[]"
+                return json.dumps(item if isinstance(item, list) else [item])
+        return "[]"
+
+    def requests_post(self, url, json=None, **kwargs):
+        self._sleep("recommendations")
+        product = (json or {}).get("product_name", "item")
+        response = mock.Mock()
+        response.status_code = 200
+        response.raise_for_status.return_value = None
+        response.json.return_value = {
+            "recommendations": [f"{product} {variant}" for variant in ("Classic", "Organic", "Family Pack")]
+            + ["Butter", "Cheese"]
+        }
+        return response
+
+    @staticmethod
+    def fake_recorder():
+        import streamlit as st
+        return st.session_state.get(AUDIO_STATE_KEY)
+
+    def fake_delayed_autoplay(self, file_path: str, delay_seconds: int):
+        if self.playback_sleep:
+            time.sleep(delay_seconds)
+        autoplay.autoplay_audio(file_path)
+
+    def __enter__(self):
+        register_backend("stt", "fake", lambda secrets: FakeSTT(self.lookup_transcript, self.latencies["stt"]))
+        register_backend("tts", "fake", lambda secrets: FakeTTS(self.latencies["tts"]))
+        register_backend("llm", "fake", lambda secrets: FakeLLM(self.respond, self.latencies["llm"]))
+
+        self._patches = [
+            mock.patch("requests.post", self.requests_post),
+            mock.patch.object(st_audiorec, "st_audiorec", self.fake_recorder),
+            mock.patch.object(autoplay, "delayed_autoplay_audio", self.fake_delayed_autoplay),
+        ]
+        for patch in self._patches:
+            patch.start()
+        return self
+
+    def __exit__(self, *exc):
+        for patch in reversed(self._patches):
+            patch.stop()
+        self._patches = []
+
+
+@contextmanager
+def concurrent_app_tests():
+    """
+    AppTest installs a mock Runtime singleton and its own ``st.secrets`` for each run and
+    restores the previous ones when the run ends, which breaks sessions still running in
+    other threads. While this is active, a shared fallback runtime is returned whenever no
+    run has one installed, and the secrets being restored are the fake ones.
+    """
+    import streamlit as st
+
+    secrets = Secrets()
+    secrets._secrets = dict(FAKE_SECRETS)
+    fallback = mock.MagicMock(spec=Runtime)
+    fallback.media_file_mgr = MediaFileManager(MemoryMediaFileStorage("/mock/media"))
+    fallback.cache_storage_manager = MemoryCacheStorageManager()
+
+    with mock.patch.object(Runtime, "instance", classmethod(lambda cls: cls._instance or fallback)), \
+            mock.patch.object(Runtime, "exists", classmethod(lambda cls: True)), \
+            mock.patch.object(st, "secrets", secrets):
+        yield
+
+
+class LoadTester:
+    """
+    Drives many concurrent simulated shopper sessions through ``main.py`` with
+    Streamlit's AppTest and reports throughput, latency, threads and memory.
+
+    Attributes:
+        - script_path: Streamlit script under test
+        - utterances: Recorded utterances replayed in order by every session
+        - timeout: Per-rerun timeout handed to AppTest
+    """
+    def __init__(self, script_path: str, utterances: List[Utterance], timeout: float):
+        self.script_path = script_path
+        self.utterances = utterances
+        self.timeout = timeout
+        self._lock = threading.Lock()
+
+    def _new_app(self) -> AppTest:
+        app = AppTest.from_file(self.script_path, default_timeout=self.timeout)
+        for key, value in FAKE_SECRETS.items():
+            app.secrets[key] = value
+        return app
+
+    def _timed_run(self, app: AppTest, latencies: List[float]):
+        start = time.perf_counter()
+        app.run()
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            latencies.append(elapsed)
+        if app.exception:
+            raise RuntimeError(app.exception[0].message)
+
+    def run_session(self, latencies: List[float]) -> AppTest:
+        """
+        Runs one shopper session: the initial page load followed by one rerun per utterance.
+
+        Args:
+            latencies (List[float]): Shared list the rerun timings are appended to
+
+        Returns:
+            AppTest: The finished session, kept alive so its memory can be measured
+        """
+        app = self._new_app()
+        self._timed_run(app, latencies)
+        for utterance in self.utterances:
+            app.session_state[AUDIO_STATE_KEY] = utterance.audio
+            self._timed_run(app, latencies)
+        return app
+
+    def run_level(self, concurrency: int, sessions: int) -> LevelReport:
+        """
+        Runs ``sessions`` sessions with at most ``concurrency`` of them active at once.
+
+        Args:
+            concurrency (int): Number of sessions running in parallel
+            sessions (int): Total number of sessions to run at this level
+
+        Returns:
+            LevelReport: Measurements for this concurrency level
+        """
+        report = LevelReport(concurrency=concurrency, sessions=sessions, wall_time=0.0)
+        finished = []
+        stop_sampling = threading.Event()
+
+        def sample_threads():
+            while not stop_sampling.is_set():
+                report.peak_threads = max(report.peak_threads, threading.active_count())
+                stop_sampling.wait(0.01)
+
+        sampler = threading.Thread(target=sample_threads, daemon=True)
+        baseline_memory = tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else 0
+
+        sampler.start()
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            futures = [pool.submit(self.run_session, report.rerun_latencies) for _ in range(sessions)]
+            for future in futures:
+                try:
+                    finished.append(future.result())
+                except Exception as e:
+                    report.errors += 1
+                    print(f"Session failed: {str(e)}")
+        report.wall_time = time.perf_counter() - start
+        stop_sampling.set()
+        sampler.join()
+
+        if tracemalloc.is_tracing() and finished:
+            report.memory_per_session = (tracemalloc.get_traced_memory()[0] - baseline_memory) / len(finished)
+        return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the ECHO AI Streamlit app with simulated sessions.")
+    parser.add_argument("--script", default="main.py", help="Streamlit script to load test")
+    parser.add_argument("--levels", default="1,2,4,8,16", help="Comma separated concurrency levels")
+    parser.add_argument("--sessions-per-level", type=int, default=0,
+                        help="Sessions per level (defaults to twice the concurrency)")
+    parser.add_argument("--utterances", help="JSON manifest of recorded utterances to replay")
+    parser.add_argument("--stt-latency", type=float, default=0.8, help="Simulated transcription latency (s)")
+    parser.add_argument("--llm-latency", type=float, default=0.4, help="Simulated LLM latency (s)")
+    parser.add_argument("--tts-latency", type=float, default=0.6, help="Simulated text-to-speech latency (s)")
+    parser.add_argument("--recommendation-latency", type=float, default=0.3,
+                        help="Simulated recommendation API latency (s)")
+    parser.add_argument("--no-playback-sleep", action="store_true",
+                        help="Skip the blocking sleep before delayed audio playback")
+    parser.add_argument("--no-memory", action="store_true", help="Disable tracemalloc memory accounting")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Per-rerun timeout (s)")
+    parser.add_argument("--output", help="Write the JSON report to this path")
+    args = parser.parse_args()
+
+    utterances = load_utterances(args.utterances)
+    latencies = {
+        "stt": args.stt_latency,
+        "llm": args.llm_latency,
+        "tts": args.tts_latency,
+        "recommendations": args.recommendation_latency,
+    }
+    tester = LoadTester(args.script, utterances, args.timeout)
+
+    if not args.no_memory:
+        tracemalloc.start()
+
+    # Recordings, synthesized speech and the session database are written outside the repository
+    output_dir = tempfile.TemporaryDirectory(prefix="echo-ai-load-test-", ignore_cleanup_errors=True)
+    FAKE_SECRETS["RECORDINGS_DIR"] = output_dir.name
+    FAKE_SECRETS["DATABASE_PATH"] = os.path.join(output_dir.name, "load_test.db")
+
+    reports = []
+    with output_dir, ProviderMocks(utterances, latencies, playback_sleep=not args.no_playback_sleep), \
+            concurrent_app_tests():
+        for level in [int(value) for value in args.levels.split(",") if value.strip()]:
+            sessions = args.sessions_per_level or level * 2
+            print(f"Running {sessions} sessions at concurrency {level}...")
+            report = tester.run_level(level, sessions)
+            reports.append(dict(report.to_dict(), prefetch=SpeculativePrefetcher.stats.to_dict(),
+                                scheduler=get_scheduler().snapshot()))
+            print(json.dumps(reports[-1]))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(reports, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,15 @@
 import streamlit as st
 import os
-import time
+import uuid
+from concurrent.futures import Future, wait
 from voice_interface import VoiceInterface
-import requests
+from recommendations import RecommendationClient
+from prefetch import SpeculativePrefetcher
+from audio_segments import SegmentComposer
+from fingerprint import TranscriptCache, fingerprint
+from store import get_store
+from scheduler import configure_rate_limits
+from resilience import TurnBudget, DeadlineExceeded
 from dotenv import load_dotenv
 from st_audiorec import st_audiorec
 from utils import DataMapping, Responses
@@ -11,9 +18,18 @@ from autoplay import autoplay_audio, delayed_autoplay_audio
 # Load environment variables
 load_dotenv(override=True)
 
+# Total seconds a voice turn may take from recording to synthesized reply
+TURN_BUDGET_SECONDS = 20.0
+# Lookups that answer within this many seconds don't get a "looking up" filler
+FILLER_GRACE_SECONDS = 0.3
+# Conversation turns kept in session state; older ones stay in the store until asked for
+MAX_TURNS_IN_MEMORY = 20
+
 class StreamlitApp:
     def __init__(self):
         """Initialize the Streamlit application."""
+        self.store = get_store(st.secrets.get('DATABASE_PATH', 'echo_ai.db'))
+        configure_rate_limits(st.secrets.get('RATE_LIMITS', {}))
         self.initialize_session_state()
         self.configure_page()
         self.add_custom_css()
@@ -25,6 +41,9 @@ class StreamlitApp:
         
         # Initialize API endpoint
         self.api_endpoint = st.secrets['API_ENDPOINT']
+        self.recommendation_client = RecommendationClient(self.api_endpoint)
+        self.composer = SegmentComposer(self.voice_interface, stats=SpeculativePrefetcher.stats)
+        self.prefetcher = SpeculativePrefetcher(self.voice_interface, self.recommendation_client, self.composer)
         
     def initialize_session_state(self):
         """Initialize session state variables."""
@@ -38,12 +57,67 @@ class StreamlitApp:
             'pending_delayed_audio': None,
             'audio_delay': None,
             'processing': False,
-            'current_recording': None
+            'current_recording': None,
+            'earlier_turns': 0
         }
         
         for var, default_value in session_vars.items():
             if var not in st.session_state:
                 st.session_state[var] = default_value
+
+        if 'session_id' not in st.session_state:
+            self.restore_session()
+
+    def restore_session(self):
+        """Attach this browser session to its persisted session, reloading recent history on reconnect."""
+        # The id is random and unguessable, but it is the only credential: anyone with the link
+        # can see this session's cart and conversation
+        session_id = st.query_params.get("session")
+        if not session_id:
+            session_id = uuid.uuid4().hex
+            st.query_params["session"] = session_id
+        st.session_state.session_id = session_id
+
+        saved = self.store.load_session(session_id)
+        if saved:
+            st.session_state.cart = saved["cart"]
+            st.session_state.last_recommendation = saved["last_recommendation"]
+            st.session_state.conversation = self.store.load_turns(session_id, limit=MAX_TURNS_IN_MEMORY)
+            st.session_state.earlier_turns = (
+                self.store.count_turns(session_id) - len(st.session_state.conversation))
+
+    def persist_session(self):
+        """Queue the session's cart and last recommendation for the store."""
+        self.store.save_session(
+            st.session_state.session_id,
+            st.session_state.cart,
+            st.session_state.last_recommendation
+        )
+
+    def add_turn(self, role: str, content: str):
+        """Append a conversation turn, persisting it and shedding the oldest turns from memory."""
+        st.session_state.conversation.append({
+            "role": role,
+            "content": content,
+            # Resolves once the store has numbered the turn; used to page back from it
+            "seq": self.store.append_turn(st.session_state.session_id, role, content)
+        })
+        shed = len(st.session_state.conversation) - MAX_TURNS_IN_MEMORY
+        if shed > 0:
+            del st.session_state.conversation[:shed]
+            st.session_state.earlier_turns += shed
+        self.persist_session()
+
+    def load_earlier_turns(self):
+        """Prepend older turns of this session from the store."""
+        session_id = st.session_state.session_id
+        oldest_seq = st.session_state.conversation[0]["seq"]
+        if isinstance(oldest_seq, Future):
+            oldest_seq = oldest_seq.result(timeout=2.0)
+        earlier = self.store.load_turns(session_id, before_seq=oldest_seq, limit=MAX_TURNS_IN_MEMORY)
+        st.session_state.conversation = earlier + st.session_state.conversation
+        st.session_state.earlier_turns = (
+            self.store.count_turns(session_id, before_seq=earlier[0]["seq"]) if earlier else 0)
                 
     def configure_page(self):
         """Configure Streamlit page settings."""
@@ -141,6 +215,7 @@ class StreamlitApp:
                     col1.text(f"• {item}")
                     if col2.button("❌", key=f"remove_{item}"):
                         st.session_state.cart.remove(item)
+                        self.persist_session()
                         st.rerun()
             
             st.sidebar.markdown("---")
@@ -157,31 +232,69 @@ class StreamlitApp:
                 [f"• {item}" for item in st.session_state.cart]
             )
             
-            st.session_state.conversation.append({
-                "role": "assistant",
-                "content": order_summary
-            })
+            self.store.record_order(st.session_state.session_id, st.session_state.cart)
+            st.session_state.cart = []
+            self.add_turn("assistant", order_summary)
             
             audio_path = self.voice_interface.text_to_speech(order_summary)
             if audio_path:
                 st.session_state.pending_audio = audio_path
             
-            st.session_state.cart = []
             st.session_state.order_complete = True
             st.rerun()
 
-    def process_audio_input(self, wav_audio_data):
+    def speak_cached_or_new(self, text: str, timeout: float):
+        """Convert text to speech, recording whether the prefetcher had already synthesized it."""
+        self.prefetcher.stats.record_lookup("speech", self.voice_interface.cached_speech(text) is not None)
+        return self.voice_interface.text_to_speech(text, timeout=timeout)
+
+    def fetch_recommendations(self, product_names: list, timeout: float):
+        """Fetch recommendations for every product at once, playing a short filler phrase if any answer isn't cached."""
+        cached = [self.recommendation_client.is_cached(name) for name in product_names]
+        for hit in cached:
+            self.prefetcher.stats.record_lookup("recommendation", hit)
+        if all(cached):
+            return self.recommendation_client.get_recommendations_many(product_names, timeout=timeout)
+
+        futures = self.recommendation_client.get_recommendations_many_async(product_names, timeout=timeout)
+        _, pending = wait(futures.values(), timeout=min(FILLER_GRACE_SECONDS, timeout))
+        if pending:
+            # The filler is only played when every segment is already synthesized, so it never
+            # delays the lookup; otherwise its segments are warmed for next time
+            segments = self.response.filler_segments(product_names)
+            if all(self.composer.is_cached(text) for text in segments):
+                filler_path = self.composer.compose(
+                    segments, self.response.filler(product_names), timeout=FILLER_GRACE_SECONDS)
+                if filler_path:
+                    autoplay_audio(filler_path)
+            else:
+                self.prefetcher.warm_filler(product_names)
+        return self.recommendation_client.collect(futures, timeout=timeout)
+
+    def transcribe_recording(self, wav_audio_data, digest: str, timeout: float):
+        """Transcribe a recording, reusing the transcript of an identical earlier submission."""
+        transcript = TranscriptCache.get(digest)
+        if transcript:
+            return transcript
+
+        # Named by content so concurrent sessions never overwrite each other's recordings
+        recording_path = os.path.join(self.voice_interface.recordings_dir, f"recording_{digest}.wav")
+        
+        with open(recording_path, 'wb') as f:
+            f.write(wav_audio_data)
+        
+        transcript = self.voice_interface.transcribe_audio(recording_path, timeout=timeout)
+        if transcript:
+            TranscriptCache.put(digest, transcript)
+        return transcript
+
+    def process_audio_input(self, wav_audio_data, digest: str):
         """Process audio input and generate recommendations."""
         try:
             st.session_state.processing = True
-            os.makedirs("recordings", exist_ok=True)
-            timestamp = time.strftime("%Y%m%d-%H%M%S")
-            recording_path = os.path.join("recordings", f"recording_{timestamp}.wav")
-            
-            with open(recording_path, 'wb') as f:
-                f.write(wav_audio_data)
-            
-            transcript = self.voice_interface.transcribe_audio(recording_path)
+            budget = TurnBudget(TURN_BUDGET_SECONDS)
+            transcript = self.transcribe_recording(
+                wav_audio_data, digest, timeout=budget.stage_timeout("transcribe"))
             
             if hasattr(transcript, 'error'):
                 st.error(f"Transcription error: {transcript.error}")
@@ -191,38 +304,41 @@ class StreamlitApp:
                 st.error("Could not understand the audio. Please try again.")
                 return
             
-            st.session_state.conversation.append({
-                "role": "user",
-                "content": transcript
-            })
+            self.add_turn("user", transcript)
             
-            item_name = self.voice_interface.extract_item_name(transcript)
+            item_names = self.voice_interface.extract_item_names(
+                transcript, timeout=budget.stage_timeout("extract"))
             
-            if not item_name:
-                order_intent = self.voice_interface.check_order_intent(transcript)
-                audio_path = self.voice_interface.text_to_speech(order_intent)
+            if not item_names:
+                order_intent = self.voice_interface.check_order_intent(
+                    transcript, timeout=budget.stage_timeout("extract"))
+                audio_path = self.speak_cached_or_new(order_intent, timeout=budget.stage_timeout("tts"))
                 if audio_path:
                     st.session_state.pending_audio = audio_path
                     
-            if item_name:
-                item_captilized = self.voice_interface.capitalize_word(item_name)
-                response = requests.post(
-                    f"{self.api_endpoint}/all-recommendations",
-                    json={"product_name": item_captilized},
-                    timeout=10
-                )
-                response.raise_for_status()
-                recommendations = response.json()["recommendations"]
+            if item_names:
+                items_captilized = [self.voice_interface.capitalize_word(name) for name in item_names]
+                recommendations_by_item = self.fetch_recommendations(
+                    items_captilized, timeout=budget.stage_timeout("recommend"))
+                recommendations = self.data_mapping.merge_recommendations(recommendations_by_item)
                 
                 st.session_state.last_recommendation = recommendations
-                matching_items, not_matching_items = self.data_mapping.split_list_on_product_name(
-                    recommendations, item_captilized)
+                self.persist_session()
+                self.prefetcher.schedule(recommendations)
+                matching_by_item, not_matching_items = self.data_mapping.split_shopping_list(
+                    recommendations_by_item)
                 
-                matching_script = self.response.matching_list(matching_items)
-                not_matching_script = self.response.not_matching_list(not_matching_items)
+                matching_segments = self.response.shopping_list_segments(matching_by_item)
+                not_matching_segments = self.response.not_matching_list_segments(not_matching_items)
                 
-                audio_path_1 = self.voice_interface.text_to_speech(matching_script)
-                audio_path_2 = self.voice_interface.text_to_speech(not_matching_script)
+                # Both clips share the turn's speech budget
+                tts_budget = TurnBudget(budget.stage_timeout("tts"))
+                audio_path_1 = self.composer.compose(
+                    matching_segments, self.response.shopping_list(matching_by_item),
+                    timeout=tts_budget.remaining())
+                audio_path_2 = self.composer.compose(
+                    not_matching_segments, self.response.not_matching_list(not_matching_items),
+                    timeout=tts_budget.remaining())
                 
                 if audio_path_1:
                     st.session_state.pending_audio = audio_path_1
@@ -230,6 +346,9 @@ class StreamlitApp:
                     st.session_state.pending_delayed_audio = audio_path_2
                     st.session_state.audio_delay = 20
             
+        except DeadlineExceeded as e:
+            st.error("Sorry, that took too long. Please try again.")
+            print(f"Error details: {str(e)}")
         except Exception as e:
             st.error(f"An error occurred: {str(e)}")
             print(f"Error details: {str(e)}")
@@ -250,10 +369,13 @@ class StreamlitApp:
                 # Add the audio recorder
                 wav_audio_data = st_audiorec()
                 
-                if wav_audio_data is not None and wav_audio_data != st.session_state.current_recording:
-                    st.session_state.current_recording = wav_audio_data
-                    self.process_audio_input(wav_audio_data)
-                    st.rerun()
+                if wav_audio_data is not None:
+                    # Only the digest is kept in session state, never the recording itself
+                    digest = fingerprint(wav_audio_data)
+                    if digest != st.session_state.current_recording:
+                        st.session_state.current_recording = digest
+                        self.process_audio_input(wav_audio_data, digest)
+                        st.rerun()
 
     def run(self):
         """Run the Streamlit application."""
@@ -275,6 +397,7 @@ class StreamlitApp:
                         if st.button("Add", key=f"add_{rec}"):
                             if rec not in st.session_state.cart:
                                 st.session_state.cart.append(rec)
+                                self.persist_session()
                                 st.rerun()
         
         # Sidebar/Cart
@@ -286,6 +409,10 @@ class StreamlitApp:
         with main_content_col1:
             # Conversation history
             st.subheader("Conversation")
+            if st.session_state.earlier_turns > 0:
+                if st.button("Show earlier messages", key="load_earlier"):
+                    self.load_earlier_turns()
+                    st.rerun()
             for message in st.session_state.conversation:
                 css_class = "user-message" if message["role"] == "user" else "assistant-message"
                 st.markdown(f"""
@@ -300,6 +427,10 @@ class StreamlitApp:
             
             # Reset button
             if st.button("🔄 Reset Conversation", key="reset"):
+                # Start a fresh persisted session; the old one stays in the store
+                st.session_state.session_id = uuid.uuid4().hex
+                st.query_params["session"] = st.session_state.session_id
+                st.session_state.earlier_turns = 0
                 st.session_state.conversation = []
                 st.session_state.cart = []
                 st.session_state.order_complete = False
@@ -0,0 +1,165 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+from scheduler import Priority
+from utils import DataMapping, Responses
+from voice_interface import DEFAULT_TTS_TIMEOUT, ORDER_DECLINED_RESPONSE, ORDER_PLACED_RESPONSE
+
+
+class PrefetchStats:
+    """
+    Thread-safe counters describing how much speculative work was done and how often it paid off.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.scheduled = 0
+        self.completed = 0
+        self.skipped = 0
+        self.tts_chars = 0
+        self.lookups: Dict[str, int] = {}
+        self.hits: Dict[str, int] = {}
+
+    def record_lookup(self, kind: str, hit: bool):
+        """
+        Records whether a lookup on the hot path was served from a warmed cache.
+
+        Args:
+            kind (str): Kind of lookup, "recommendation" or "speech"
+            hit (bool): True if the answer was already cached
+        """
+        with self._lock:
+            self.lookups[kind] = self.lookups.get(kind, 0) + 1
+            if hit:
+                self.hits[kind] = self.hits.get(kind, 0) + 1
+
+    def _add(self, counter: str, amount: int = 1):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + amount)
+
+    def hit_rate(self, kind: str) -> float:
+        with self._lock:
+            lookups = self.lookups.get(kind, 0)
+            return self.hits.get(kind, 0) / lookups if lookups else 0.0
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            summary = {
+                "scheduled": self.scheduled,
+                "completed": self.completed,
+                "skipped": self.skipped,
+                "tts_chars": self.tts_chars,
+            }
+        for kind in list(self.lookups):
+            summary[f"{kind}_hit_rate"] = round(self.hit_rate(kind), 3)
+        return summary
+
+
+class SpeculativePrefetcher:
+    """
+    Warms the recommendation and speech caches in the background after a turn, betting that
+    the shopper will next ask about one of the listed items or answer yes/no.
+
+    Attributes:
+        - composer: SegmentComposer used to pre-synthesize reply segments
+        - max_items: How many of the listed items to warm per turn
+        - max_tts_chars: Characters of speech that may be synthesized per turn
+        - max_pending: Tasks allowed to queue before new speculation is dropped
+    """
+    _executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="prefetch")
+    _budget_lock = threading.Lock()
+    # Submitted tasks that haven't finished yet, shared by every session
+    _pending_lock = threading.Lock()
+    _pending = 0
+    stats = PrefetchStats()
+
+    def __init__(self, voice_interface, recommendation_client, composer, max_items: int = 3,
+                 max_tts_chars: int = 1200, max_pending: int = 8):
+        self.voice_interface = voice_interface
+        self.recommendation_client = recommendation_client
+        self.composer = composer
+        self.max_items = max_items
+        self.max_tts_chars = max_tts_chars
+        self.max_pending = max_pending
+
+    def _submit(self, fn, *args) -> bool:
+        cls = type(self)
+        with cls._pending_lock:
+            if cls._pending >= self.max_pending:
+                self.stats._add("skipped")
+                return False
+            cls._pending += 1
+        self.stats._add("scheduled")
+        self._executor.submit(self._run, fn, *args)
+        return True
+
+    def _run(self, fn, *args):
+        try:
+            fn(*args)
+            self.stats._add("completed")
+        except Exception as e:
+            print(f"Error during prefetch: {str(e)}")
+        finally:
+            cls = type(self)
+            with cls._pending_lock:
+                cls._pending -= 1
+
+    def _within_budget(self, text: str, budget: List[int]) -> bool:
+        with self._budget_lock:
+            if budget[0] < len(text):
+                self.stats._add("skipped")
+                return False
+            budget[0] -= len(text)
+            return True
+
+    def _synthesize(self, texts: List[str], budget: List[int]):
+        for text in texts:
+            if self.voice_interface.cached_speech(text):
+                continue
+            if self._within_budget(text, budget) and self.voice_interface.text_to_speech(text, priority=Priority.WARMUP):
+                self.stats._add("tts_chars", len(text))
+
+    def _synthesize_segments(self, segments: List[str], budget: List[int]):
+        # Only segments never heard before cost anything; product names are usually the only ones
+        missing = [text for text in dict.fromkeys(segments) if not self.composer.is_cached(text)]
+        allowed = [text for text in missing if self._within_budget(text, budget)]
+        failed = self.composer.warm(allowed, timeout=DEFAULT_TTS_TIMEOUT, priority=Priority.PREFETCH) if allowed else []
+        self.stats._add("tts_chars", sum(len(text) for text in allowed if text not in failed))
+
+    def _warm_item(self, item: str, budget: List[int]):
+        product_name = self.voice_interface.capitalize_word(item)
+        recommendations = self.recommendation_client.get_recommendations(product_name, priority=Priority.PREFETCH)
+        if not recommendations:
+            return
+        matching, not_matching = DataMapping.split_list_on_product_name(recommendations, product_name)
+        self._synthesize_segments(
+            Responses.matching_list_segments(matching) + Responses.not_matching_list_segments(not_matching), budget)
+
+    def schedule(self, recommendations: List[str]):
+        """
+        Schedules speculative work for the items just shown to the shopper.
+
+        Args:
+            recommendations (List[str]): Items from the last recommendation, best first
+        """
+        # Budget is a shared mutable counter so all tasks from this turn draw from the same pool
+        budget = [self.max_tts_chars]
+        # Replies to yes/no follow-ups, so the answer plays without waiting on TTS
+        self._submit(self._synthesize, [ORDER_PLACED_RESPONSE, ORDER_DECLINED_RESPONSE], budget)
+        for item in recommendations[:self.max_items]:
+            self._submit(self._warm_item, item, budget)
+
+    def _warm_filler(self, products: List[str]):
+        self.composer.warm(Responses.filler_segments(products), timeout=DEFAULT_TTS_TIMEOUT,
+                           priority=Priority.WARMUP)
+
+    def warm_filler(self, products: List[str]):
+        """
+        Synthesizes the filler phrase's segments in the background, so the next lookup of these
+        products (or any others, for the template phrases) can play it without waiting on TTS.
+
+        Args:
+            products (List[str]): Product names being looked up
+        """
+        if any(not self.composer.is_cached(text) for text in Responses.filler_segments(products)):
+            self._submit(self._warm_filler, products)
@@ -0,0 +1,536 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Callable, Dict, List, Mapping, Optional, Tuple
+
+import numpy as np
+import requests
+
+from resilience import get_breaker, hedged_call
+from scheduler import AdmissionRejected, Call, Priority, get_scheduler
+
+# Backends used for each capability when the secrets don't name any. Failover backends are opt-in,
+# since a second TTS backend speaks with a different voice.
+DEFAULT_BACKENDS = {
+    "stt": "assemblyai",
+    "tts": "elevenlabs",
+    "llm": "openai",
+}
+
+# Transcriptions AssemblyAI polls for at once, process-wide; more wait for a free worker
+TRANSCRIBE_WORKERS = 8
+# A healthy primary is only replaced by a backend this many times faster, so the voice doesn't flap
+SWITCH_MARGIN = 1.5
+# Least number of seconds between background probes of a backend that has no recent samples
+PROBE_INTERVAL = 30.0
+
+ELEVENLABS_VOICES = {
+    "rachel": "Xb7hH8MSUJpSbSDYk0k2",    # Rachel
+    "domi": "pqHfZKP75CvOlQylNhV4",      # Domi
+    "bella": "9BWtsMINqrJLrRacOk9x",     # Bella
+    "antoni": "nPczCjzI2devNBz1zQrb",     # Antoni
+    "elli": "pFZP5JQG7iQjIQuC4Bku",      # Elli
+}
+
+# A single silent MPEG frame, returned by the fake TTS backend
+SILENT_MP3 = b"\xff\xfb\x90\x00" + bytes(413)
+
+
+class ProviderUnavailable(Exception):
+    """Raised when every backend registered for a capability failed or is circuit-broken."""
+
+
+class STTProvider:
+    """Speech-to-text backend."""
+    name = "stt"
+
+    def transcribe(self, audio_path: str, timeout: float) -> str:
+        """Returns the transcript of an audio file, raising on any failure."""
+        raise NotImplementedError
+
+
+class TTSProvider:
+    """Text-to-speech backend."""
+    name = "tts"
+    voice_id = ""
+
+    def synthesize(self, text: str, timeout: float) -> bytes:
+        """Returns MP3 audio for the text, raising on any failure."""
+        raise NotImplementedError
+
+    def synthesize_pcm(self, text: str, timeout: float) -> Tuple[np.ndarray, int]:
+        """Returns mono 16-bit samples and their sample rate for the text, raising on any failure."""
+        raise NotImplementedError
+
+
+class LLMProvider:
+    """Chat completion backend."""
+    name = "llm"
+
+    def complete(self, system: str, prompt: str, max_tokens: Optional[int], timeout: float) -> str:
+        """Returns the model's reply to a single-turn prompt, raising on any failure."""
+        raise NotImplementedError
+
+
+class AssemblyAISTT(STTProvider):
+    """
+    Transcribes on a bounded pool owned by this class rather than the SDK's default executor,
+    so concurrent sessions can't pile up behind an unbounded number of polling threads.
+    """
+    name = "assemblyai"
+    _executor = ThreadPoolExecutor(max_workers=TRANSCRIBE_WORKERS, thread_name_prefix="assemblyai")
+
+    def __init__(self, api_key: str):
+        import assemblyai as aai
+        aai.settings.api_key = api_key
+        self._aai = aai
+        self.transcriber = aai.Transcriber()
+
+    def transcribe(self, audio_path: str, timeout: float) -> str:
+        # Polling happens on our worker thread; we only wait as long as the budget allows
+        future = self._executor.submit(self.transcriber.transcribe, audio_path)
+        try:
+            transcript = future.result(timeout=timeout)
+        except FutureTimeoutError:
+            if future.cancel():
+                # Never reached AssemblyAI, so the router doesn't count it against the backend's breaker
+                raise AdmissionRejected(f"{self.name} had no free transcription worker within {timeout:.1f}s")
+            raise
+        if transcript.status == self._aai.TranscriptStatus.error:
+            raise RuntimeError(f"Transcription error: {transcript.error}")
+        return transcript.text
+
+
+class OpenAIWhisperSTT(STTProvider):
+    name = "openai-whisper"
+
+    def __init__(self, api_key: str, model: str = "whisper-1"):
+        from openai import OpenAI
+        self.client = OpenAI(api_key=api_key, max_retries=0)
+        self.model = model
+
+    def transcribe(self, audio_path: str, timeout: float) -> str:
+        with open(audio_path, "rb") as audio_file:
+            transcript = self.client.audio.transcriptions.create(model=self.model, file=audio_file, timeout=timeout)
+        return transcript.text
+
+
+class ElevenLabsTTS(TTSProvider):
+    name = "elevenlabs"
+    tts_url = "https://api.elevenlabs.io/v1/text-to-speech"
+    pcm_rate = 22050
+
+    def __init__(self, api_key: str, voice_id: str, hedge_after: float = 4.0):
+        self.api_key = api_key
+        self.voice_id = voice_id
+        self.hedge_after = hedge_after
+
+    def _request(self, text: str, timeout: float, params: Optional[dict] = None) -> bytes:
+        url = f"{self.tts_url}/{self.voice_id}"
+        headers = {
+            "Accept": "audio/mpeg",
+            "Content-Type": "application/json",
+            "xi-api-key": self.api_key
+        }
+        data = {
+            "text": text,
+            "model_id": "eleven_monolingual_v1",
+            "voice_settings": {
+                "stability": 0.5,
+                "similarity_boost": 0.5
+            }
+        }
+
+        def request_speech():
+            response = requests.post(url, json=data, headers=headers, params=params, timeout=timeout)
+            if response.status_code != 200:
+                raise requests.HTTPError(
+                    f"ElevenLabs API returned {response.status_code}: {response.text}", response=response)
+            return response.content
+
+        # A hedged duplicate is a second request, so it needs its own rate limit token
+        return hedged_call(request_speech, timeout=timeout, hedge_after=min(self.hedge_after, timeout), pool=self.name,
+                           may_hedge=lambda: get_scheduler().try_admit(self.name))
+
+    def synthesize(self, text: str, timeout: float) -> bytes:
+        return self._request(text, timeout)
+
+    def synthesize_pcm(self, text: str, timeout: float) -> Tuple[np.ndarray, int]:
+        audio = self._request(text, timeout, params={"output_format": f"pcm_{self.pcm_rate}"})
+        return np.frombuffer(audio, dtype="<i2"), self.pcm_rate
+
+
+class OpenAITTS(TTSProvider):
+    name = "openai-tts"
+
+    def __init__(self, api_key: str, voice: str = "nova", model: str = "tts-1"):
+        from openai import OpenAI
+        self.client = OpenAI(api_key=api_key, max_retries=0)
+        self.voice_id = voice
+        self.model = model
+
+    def synthesize(self, text: str, timeout: float) -> bytes:
+        response = self.client.audio.speech.create(
+            model=self.model, voice=self.voice_id, input=text, response_format="mp3", timeout=timeout)
+        return response.content
+
+    def synthesize_pcm(self, text: str, timeout: float) -> Tuple[np.ndarray, int]:
+        # OpenAI's raw PCM output is always 24kHz 16-bit little-endian mono
+        response = self.client.audio.speech.create(
+            model=self.model, voice=self.voice_id, input=text, response_format="pcm", timeout=timeout)
+        return np.frombuffer(response.content, dtype="<i2"), 24000
+
+
+class OpenAILLM(LLMProvider):
+    name = "openai"
+
+    def __init__(self, api_key: str, model: str = "gpt-4o-mini"):
+        from openai import OpenAI
+        self.client = OpenAI(api_key=api_key, max_retries=0)
+        self.model = model
+
+    def complete(self, system: str, prompt: str, max_tokens: Optional[int], timeout: float) -> str:
+        completion = self.client.chat.completions.create(
+            model=self.model,
+            messages=[
+                {"role": "system", "content": system},
+                {"role": "user", "content": prompt}
+            ],
+            temperature=0,  # Use 0 for consistent responses
+            max_tokens=max_tokens,
+            timeout=timeout
+        )
+        return completion.choices[0].message.content.strip()
+
+
+class FakeSTT(STTProvider):
+    """In-process STT for tests: looks transcripts up by a key derived from the audio file."""
+    name = "fake"
+
+    def __init__(self, lookup: Callable[[str], Optional[str]], latency: float = 0.0, name: str = "fake"):
+        self.lookup = lookup
+        self.latency = latency
+        self.name = name
+
+    def transcribe(self, audio_path: str, timeout: float) -> str:
+        time.sleep(min(self.latency, timeout))
+        return self.lookup(audio_path)
+
+
+class FakeTTS(TTSProvider):
+    """In-process TTS for tests: returns a silent clip after a fixed latency, in a voice named after it."""
+    name = "fake"
+    voice_id = "fake"
+
+    def __init__(self, latency: float = 0.0, name: str = "fake"):
+        self.latency = latency
+        self.name = name
+        self.voice_id = name
+
+    def synthesize(self, text: str, timeout: float) -> bytes:
+        time.sleep(min(self.latency, timeout))
+        return SILENT_MP3
+
+    def synthesize_pcm(self, text: str, timeout: float) -> Tuple[np.ndarray, int]:
+        time.sleep(min(self.latency, timeout))
+        # Roughly the length real speech would have, so composed clips have realistic sizes
+        return np.zeros(len(text) * 1000, dtype=np.int16), 16000
+
+
+class FakeLLM(LLMProvider):
+    """In-process LLM for tests: answers with a caller supplied function of (system, prompt)."""
+    name = "fake"
+
+    def __init__(self, respond: Callable[[str, str], str], latency: float = 0.0, name: str = "fake"):
+        self.respond = respond
+        self.latency = latency
+        self.name = name
+
+    def complete(self, system: str, prompt: str, max_tokens: Optional[int], timeout: float) -> str:
+        time.sleep(min(self.latency, timeout))
+        return self.respond(system, prompt)
+
+
+class BackendStats:
+    """
+    Rolling latency and error rate for one backend over its last ``window`` calls. Samples
+    older than ``max_age`` seconds are ignored so a backend that was demoted gets retried.
+    """
+    def __init__(self, window: int = 20, max_age: float = 60.0):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.max_age = max_age
+
+    def record(self, latency: float, ok: bool):
+        with self._lock:
+            self._samples.append((time.monotonic(), latency, ok))
+
+    def snapshot(self) -> dict:
+        cutoff = time.monotonic() - self.max_age
+        with self._lock:
+            samples = [(latency, ok) for recorded, latency, ok in self._samples if recorded >= cutoff]
+        successes = [latency for latency, ok in samples if ok]
+        return {
+            "calls": len(samples),
+            "mean_latency": sum(successes) / len(successes) if successes else 0.0,
+            "error_rate": 1 - len(successes) / len(samples) if samples else 0.0,
+        }
+
+    def score(self) -> Tuple[int, float]:
+        """
+        Lower is better. Backends with recent successes rank first by latency, then unmeasured
+        ones, then ones whose recent calls all failed, so an idle backend never displaces a
+        healthy one that is in use.
+        """
+        stats = self.snapshot()
+        if not stats["calls"]:
+            return 1, 0.0
+        if stats["error_rate"] >= 1.0:
+            return 2, 0.0
+        return 0, stats["mean_latency"] / (1 - stats["error_rate"])
+
+
+class ProviderRouter:
+    """
+    Routes calls for one capability to the fastest healthy backend, failing over to the
+    next one when a call raises. Each backend has its own circuit breaker and rolling stats.
+    Backends without recent samples are probed in the background with a copy of a live call,
+    so a faster one is noticed; the primary only changes when it stops answering or another
+    backend is ``switch_margin`` times faster, so the voice doesn't flip back and forth.
+
+    Attributes:
+        - capability: "stt", "tts" or "llm"
+        - backends: Backends in preference order, used to break ties
+        - switch_margin: How many times faster another backend must be to replace the primary
+        - probe_interval: Least number of seconds between probes of one idle backend
+    """
+    _probe_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="probe")
+
+    def __init__(self, capability: str, backends: List[object], switch_margin: float = SWITCH_MARGIN,
+                 probe_interval: float = PROBE_INTERVAL):
+        self.capability = capability
+        self.backends = backends
+        self.switch_margin = switch_margin
+        self.probe_interval = probe_interval
+        self.stats = {backend.name: BackendStats() for backend in backends}
+        self.breakers = {backend.name: get_breaker(f"{capability}:{backend.name}") for backend in backends}
+        self._primary = None
+        self._last_probe = {backend.name: float("-inf") for backend in backends}
+        self._lock = threading.Lock()
+
+    def _should_switch(self, current: Tuple[int, float], best: Tuple[int, float]) -> bool:
+        current_tier, current_score = current
+        best_tier, best_score = best
+        if current_tier == 2:
+            # Every recent call to the primary failed
+            return True
+        return current_tier == 0 and best_tier == 0 and current_score > best_score * self.switch_margin
+
+    def ranked(self) -> List[object]:
+        """Returns the primary backend followed by the others ordered by score, registration order breaking ties."""
+        order = {backend.name: index for index, backend in enumerate(self.backends)}
+        scores = {backend.name: self.stats[backend.name].score() for backend in self.backends}
+        candidates = sorted(self.backends, key=lambda backend: (*scores[backend.name], order[backend.name]))
+        best = candidates[0]
+        with self._lock:
+            current = self._primary
+            if current is not None and current is not best and \
+                    not self._should_switch(scores[current.name], scores[best.name]):
+                best = current
+            self._primary = best
+        return [best] + [backend for backend in candidates if backend is not best]
+
+    @property
+    def primary(self):
+        return self.ranked()[0]
+
+    def call(self, method: str, *args, timeout: float, priority: Priority = Priority.INTERACTIVE, **kwargs):
+        """
+        Calls ``method`` on the best backend, failing over until one succeeds or time runs out.
+        Identical calls already in flight from other sessions are shared rather than repeated.
+
+        Args:
+            method (str): Provider method name, e.g. "transcribe"
+            timeout (float): Seconds all attempts together may take
+            priority (Priority): Admission priority against other calls to the same backends
+
+        Returns:
+            Whatever the backend method returns
+
+        Raises:
+            ProviderUnavailable: If no backend succeeded
+        """
+        return self.call_with_backend(method, *args, timeout=timeout, priority=priority, **kwargs)[1]
+
+    def call_with_backend(self, method: str, *args, timeout: float, priority: Priority = Priority.INTERACTIVE,
+                          **kwargs) -> Tuple[object, object]:
+        """
+        Like ``call``, but also returns the backend that answered, for results that depend on it
+        (such as the voice of synthesized speech).
+
+        Returns:
+            Tuple[object, object]: The backend that answered and what its method returned
+        """
+        self._probe_idle(method, args, kwargs, timeout)
+        key = (self.capability, method, args, tuple(sorted(kwargs.items())))
+        return get_scheduler().coalesce(
+            key, lambda call: self._call(call, method, args, kwargs, timeout), priority, timeout)
+
+    def _attempt(self, backend, call: Call, method: str, args: tuple, kwargs: dict, deadline: float):
+        """
+        Sends one call to one backend through its rate limit, recording the outcome in its stats
+        and breaker. The caller must have been let through by the breaker.
+
+        Raises:
+            AdmissionRejected: If the backend didn't admit the call in time
+            Exception: Whatever the backend raised
+        """
+        breaker = self.breakers[backend.name]
+        # Latency is measured from admission, so queueing under load doesn't demote a backend
+        started = []
+
+        def send():
+            started.append(time.monotonic())
+            return getattr(backend, method)(*args, timeout=max(0.0, deadline - time.monotonic()), **kwargs)
+
+        try:
+            result = get_scheduler().admit(backend.name, call, send, timeout=max(0.0, deadline - time.monotonic()))
+        except AdmissionRejected:
+            breaker.release_trial()
+            raise
+        except Exception:
+            self.stats[backend.name].record(time.monotonic() - started[0], ok=False)
+            breaker.record_failure()
+            raise
+
+        self.stats[backend.name].record(time.monotonic() - started[0], ok=True)
+        breaker.record_success()
+        return result
+
+    def _call(self, call: Call, method: str, args: tuple, kwargs: dict, timeout: float):
+        deadline = time.monotonic() + timeout
+        errors = []
+        for backend in self.ranked():
+            if deadline - time.monotonic() <= 0:
+                break
+            if not self.breakers[backend.name].allow():
+                errors.append(f"{backend.name}: circuit open")
+                continue
+
+            try:
+                return backend, self._attempt(backend, call, method, args, kwargs, deadline)
+            except AdmissionRejected as e:
+                errors.append(f"{backend.name}: {str(e)}")
+            except Exception as e:
+                errors.append(f"{backend.name}: {str(e)}")
+                print(f"{self.capability} backend '{backend.name}' failed, failing over: {str(e)}")
+
+        raise ProviderUnavailable(f"No {self.capability} backend available ({'; '.join(errors) or 'out of time'})")
+
+    def _probe_idle(self, method: str, args: tuple, kwargs: dict, timeout: float):
+        """Sends a copy of a call, in the background, to each backend with no recent samples."""
+        primary = self.primary
+        now = time.monotonic()
+        with self._lock:
+            idle = [
+                backend for backend in self.backends
+                if backend is not primary and not self.stats[backend.name].snapshot()["calls"]
+                and now - self._last_probe[backend.name] >= self.probe_interval
+            ]
+            for backend in idle:
+                self._last_probe[backend.name] = now
+        for backend in idle:
+            self._probe_executor.submit(self._probe, backend, method, args, kwargs, timeout)
+
+    def _probe(self, backend, method: str, args: tuple, kwargs: dict, timeout: float):
+        if not self.breakers[backend.name].allow():
+            return
+        try:
+            # Lowest priority, so probes never hold up a shopper's turn; the result is only measured
+            self._attempt(backend, Call(Priority.WARMUP), method, args, kwargs, time.monotonic() + timeout)
+        except Exception as e:
+            print(f"Probe of {self.capability} backend '{backend.name}' failed: {str(e)}")
+
+    def snapshot(self) -> Dict[str, dict]:
+        return {
+            backend.name: dict(self.stats[backend.name].snapshot(), circuit=self.breakers[backend.name].state)
+            for backend in self.backends
+        }
+
+
+def _elevenlabs_factory(secrets: Mapping) -> ElevenLabsTTS:
+    voice = secrets.get("ELEVENLABS_VOICE", "rachel")
+    return ElevenLabsTTS(secrets["ELEVENLABS_API_KEY"], ELEVENLABS_VOICES.get(voice, voice))
+
+
+_factories: Dict[str, Dict[str, Callable[[Mapping], object]]] = {
+    "stt": {
+        "assemblyai": lambda secrets: AssemblyAISTT(secrets["ASSEMBLYAI_API_KEY"]),
+        "openai-whisper": lambda secrets: OpenAIWhisperSTT(secrets["OPENAI_API_KEY"]),
+    },
+    "tts": {
+        "elevenlabs": _elevenlabs_factory,
+        "openai-tts": lambda secrets: OpenAITTS(secrets["OPENAI_API_KEY"]),
+    },
+    "llm": {
+        "openai": lambda secrets: OpenAILLM(secrets["OPENAI_API_KEY"]),
+    },
+}
+_routers: Dict[tuple, ProviderRouter] = {}
+_routers_lock = threading.Lock()
+
+
+def register_backend(capability: str, name: str, factory: Callable[[Mapping], object]):
+    """
+    Registers a backend factory so it can be named in ``<CAPABILITY>_BACKENDS`` secrets.
+
+    Args:
+        capability (str): "stt", "tts" or "llm"
+        name (str): Backend name
+        factory (Callable[[Mapping], object]): Builds the backend from the app secrets
+    """
+    _factories[capability][name] = factory
+
+
+def get_router(capability: str, secrets: Mapping) -> ProviderRouter:
+    """
+    Returns the process-wide router for a capability, building its backends on first use so
+    latency and error stats are shared by every session.
+
+    Args:
+        capability (str): "stt", "tts" or "llm"
+        secrets (Mapping): App secrets; ``<CAPABILITY>_BACKENDS`` lists backend names in preference order
+
+    Returns:
+        ProviderRouter: Router over every backend that could be configured
+
+    Raises:
+        ValueError: If none of the named backends could be configured
+    """
+    names = tuple(
+        name.strip() for name in secrets.get(f"{capability.upper()}_BACKENDS", DEFAULT_BACKENDS[capability]).split(",")
+        if name.strip()
+    )
+    with _routers_lock:
+        router = _routers.get((capability, names))
+        if router:
+            return router
+
+        backends = []
+        for name in names:
+            try:
+                backend = _factories[capability][name](secrets)
+            except Exception as e:
+                print(f"Skipping {capability} backend '{name}': {str(e)}")
+                continue
+            # Stats, breakers, rate limits and hedge pools are keyed by the name it was registered under
+            backend.name = name
+            backends.append(backend)
+
+        if not backends:
+            raise ValueError(f"Missing required API keys for every {capability} backend ({', '.join(names)})")
+
+        router = ProviderRouter(capability, backends)
+        _routers[(capability, names)] = router
+        return router
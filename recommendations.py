@@ -0,0 +1,185 @@
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+import requests
+from cachetools import TTLCache
+
+from resilience import CircuitOpenError, get_breaker, hedged_call
+from scheduler import AdmissionRejected, Call, Priority, get_scheduler
+
+# Fresh answers per product, served without calling the API (warmed by the prefetcher)
+_recommendation_cache = TTLCache(maxsize=1024, ttl=10 * 60)
+# Last good answer per product, served when the recommendation API is unavailable
+_fallback_cache = TTLCache(maxsize=1024, ttl=6 * 60 * 60)
+_cache_lock = threading.Lock()
+
+
+class RecommendationClient:
+    """
+    Client for the echo-ai recommender API with hedged requests, a circuit breaker and a
+    last-known-good fallback cache.
+
+    Attributes:
+        - api_endpoint: Base URL of the recommender API
+        - default_timeout: Timeout used when the caller doesn't pass one
+        - hedge_after: Seconds to wait before firing a duplicate request
+    """
+    _executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="recommendations")
+
+    def __init__(self, api_endpoint: str, default_timeout: float = 10.0, hedge_after: float = 1.5):
+        self.api_endpoint = api_endpoint
+        self.default_timeout = default_timeout
+        self.hedge_after = hedge_after
+        self.breaker = get_breaker("recommendations")
+
+    def _request(self, product_name: str, timeout: float) -> List[str]:
+        response = requests.post(
+            f"{self.api_endpoint}/all-recommendations",
+            json={"product_name": product_name},
+            timeout=timeout
+        )
+        response.raise_for_status()
+        return response.json()["recommendations"]
+
+    def is_cached(self, product_name: str) -> bool:
+        """Returns True if fresh recommendations for the product are cached."""
+        with _cache_lock:
+            return product_name.lower() in _recommendation_cache
+
+    def _fetch(self, call: Call, product_name: str, timeout: float) -> List[str]:
+        # Checked before queueing, so a call never waits for a token only to be rejected by the breaker
+        if not self.breaker.allow():
+            raise CircuitOpenError(f"Circuit breaker '{self.breaker.name}' is open")
+        deadline = time.monotonic() + timeout
+
+        def send() -> List[str]:
+            remaining = max(0.0, deadline - time.monotonic())
+            return hedged_call(
+                lambda: self._request(product_name, remaining),
+                timeout=remaining,
+                hedge_after=min(self.hedge_after, remaining),
+                pool="recommendations",
+                may_hedge=lambda: get_scheduler().try_admit("recommendations")
+            )
+
+        try:
+            recommendations = get_scheduler().admit("recommendations", call, send, timeout=timeout)
+        except AdmissionRejected:
+            self.breaker.release_trial()
+            raise
+        except Exception:
+            self.breaker.record_failure()
+            raise
+        self.breaker.record_success()
+        return recommendations
+
+    def get_recommendations(self, product_name: str, timeout: Optional[float] = None,
+                            priority: Priority = Priority.INTERACTIVE) -> List[str]:
+        """
+        Fetches recommendations for a product, serving fresh cached answers without a request.
+        Concurrent lookups of the same product from different sessions share one request.
+
+        Args:
+            product_name (str): Capitalized product name
+            timeout (Optional[float]): Seconds this call may take in total
+            priority (Priority): Admission priority against other sessions' lookups
+
+        Returns:
+            List[str]: Recommended items, the cached answer if the API is failing,
+                or an empty list if nothing is cached
+        """
+        key = product_name.lower()
+        with _cache_lock:
+            cached = _recommendation_cache.get(key)
+        if cached is not None:
+            return cached
+
+        timeout = timeout or self.default_timeout
+        try:
+            recommendations = get_scheduler().coalesce(
+                ("recommendations", key),
+                lambda call: self._fetch(call, product_name, timeout),
+                priority,
+                timeout
+            )
+            with _cache_lock:
+                _recommendation_cache[key] = recommendations
+                _fallback_cache[key] = recommendations
+            return recommendations
+
+        except CircuitOpenError as e:
+            print(f"{str(e)}, serving cached recommendations for {product_name}")
+        except Exception as e:
+            print(f"Error fetching recommendations: {str(e)}")
+
+        with _cache_lock:
+            return _fallback_cache.get(key, [])
+
+    def get_recommendations_async(self, product_name: str, timeout: Optional[float] = None) -> Future:
+        """
+        Starts fetching recommendations in the background so the caller can do other work,
+        such as playing a filler phrase, while the request is in flight.
+
+        Args:
+            product_name (str): Capitalized product name
+            timeout (Optional[float]): Seconds the call may take in total
+
+        Returns:
+            Future: Resolves to the same result as get_recommendations
+        """
+        return self._executor.submit(self.get_recommendations, product_name, timeout)
+
+    def get_recommendations_many_async(self, product_names: List[str], timeout: Optional[float] = None) -> Dict[str, Future]:
+        """
+        Starts fetching recommendations for several products concurrently.
+
+        Args:
+            product_names (List[str]): Capitalized product names; case-insensitive duplicates are dropped
+            timeout (Optional[float]): Seconds each lookup may take
+
+        Returns:
+            Dict[str, Future]: One pending lookup per unique product name, in request order
+        """
+        unique_names = []
+        for name in product_names:
+            if name.lower() not in [unique.lower() for unique in unique_names]:
+                unique_names.append(name)
+        return {name: self.get_recommendations_async(name, timeout=timeout) for name in unique_names}
+
+    def collect(self, futures: Dict[str, Future], timeout: Optional[float] = None) -> Dict[str, List[str]]:
+        """
+        Waits for lookups started by get_recommendations_many_async.
+
+        Args:
+            futures (Dict[str, Future]): Pending lookups per product name
+            timeout (Optional[float]): Seconds to wait for the whole batch
+
+        Returns:
+            Dict[str, List[str]]: Recommendations per product name. Products whose lookup
+                didn't finish in time map to an empty list.
+        """
+        deadline = time.monotonic() + (timeout or self.default_timeout)
+        results = {}
+        for name, future in futures.items():
+            try:
+                results[name] = future.result(timeout=max(0.0, deadline - time.monotonic()))
+            except Exception as e:
+                print(f"Error fetching recommendations for {name}: {str(e)}")
+                results[name] = []
+        return results
+
+    def get_recommendations_many(self, product_names: List[str], timeout: Optional[float] = None) -> Dict[str, List[str]]:
+        """
+        Fetches recommendations for several products concurrently, so a whole shopping list
+        costs about as much as a single lookup.
+
+        Args:
+            product_names (List[str]): Capitalized product names; case-insensitive duplicates are dropped
+            timeout (Optional[float]): Seconds the whole batch may take
+
+        Returns:
+            Dict[str, List[str]]: Recommendations per product name, in request order
+        """
+        return self.collect(self.get_recommendations_many_async(product_names, timeout=timeout), timeout=timeout)
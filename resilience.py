@@ -0,0 +1,246 @@
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Optional, TypeVar
+
+T = TypeVar("T")
+
+# Share of a turn's total budget each stage may spend. Stages never get more than what is left.
+DEFAULT_STAGE_SHARES = {
+    "transcribe": 0.35,
+    "extract": 0.15,
+    "recommend": 0.2,
+    "tts": 0.3,
+}
+
+# Workers per provider for hedged requests; a slow provider can only tie up its own pool
+HEDGE_POOL_SIZE = 8
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a stage is started after its turn budget has run out."""
+
+
+class CircuitOpenError(Exception):
+    """Raised when a call is rejected because the provider's circuit breaker is open."""
+
+
+class TurnBudget:
+    """
+    Deadline budget for a single voice turn, split across its stages.
+
+    Attributes:
+        - total: Total number of seconds the turn may take
+        - shares: Fraction of the total each stage may spend
+        - minimum: Smallest timeout handed to a stage while budget remains
+    """
+    def __init__(self, total: float, shares: Optional[Dict[str, float]] = None, minimum: float = 0.5):
+        self.total = total
+        self.shares = shares or DEFAULT_STAGE_SHARES
+        self.minimum = minimum
+        self._started = time.monotonic()
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self._started
+
+    def remaining(self) -> float:
+        return max(0.0, self.total - self.elapsed())
+
+    def stage_timeout(self, stage: str) -> float:
+        """
+        Returns the timeout for a stage: its share of the total budget, capped by what is left.
+
+        Args:
+            stage (str): Stage name, one of the keys in ``shares``
+
+        Returns:
+            float: Timeout in seconds
+
+        Raises:
+            DeadlineExceeded: If the turn budget is already spent
+        """
+        remaining = self.remaining()
+        if remaining <= 0:
+            raise DeadlineExceeded(f"Turn budget of {self.total}s exhausted before stage '{stage}'")
+        allotted = self.total * self.shares.get(stage, 0.0)
+        return min(remaining, max(allotted, self.minimum))
+
+
+class CircuitBreaker:
+    """
+    Per-provider circuit breaker. After ``failure_threshold`` consecutive failures the
+    circuit opens and calls fail fast for ``reset_timeout`` seconds, after which a single
+    trial call is let through (half-open) to decide whether to close it again.
+
+    Attributes:
+        - name: Provider name used in log messages
+        - failure_threshold: Consecutive failures that open the circuit
+        - reset_timeout: Seconds to stay open before allowing a trial call
+    """
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int = 3, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                return self.HALF_OPEN
+            return self._state
+
+    def allow(self) -> bool:
+        """Returns True if a call may go through, claiming the half-open trial slot if needed."""
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self._state = self.HALF_OPEN
+                return True
+            return False
+
+    def release_trial(self):
+        """Gives back a claimed half-open trial slot when the trial call was never sent."""
+        with self._lock:
+            if self._state == self.HALF_OPEN:
+                self._state = self.OPEN
+
+    def record_success(self):
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    print(f"Circuit breaker '{self.name}' opened after {self._failures} failures")
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name: str, **kwargs) -> CircuitBreaker:
+    """
+    Returns the process-wide circuit breaker for a provider, creating it on first use.
+
+    Args:
+        name (str): Provider name, e.g. "elevenlabs"
+        **kwargs: CircuitBreaker settings used only when the breaker is created
+
+    Returns:
+        CircuitBreaker: Shared breaker for the provider
+    """
+    with _breakers_lock:
+        if name not in _breakers:
+            _breakers[name] = CircuitBreaker(name, **kwargs)
+        return _breakers[name]
+
+
+class HedgePool:
+    """
+    Bounded worker pool for one provider's hedged requests. Attempts are never queued behind
+    busy workers: the caller is told there is no free worker and decides what to do instead.
+
+    Attributes:
+        - name: Provider name, used for thread names
+        - max_workers: Attempts that may run at once
+    """
+    def __init__(self, name: str, max_workers: int = HEDGE_POOL_SIZE):
+        self.name = name
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"hedge-{name}")
+        self._slots = threading.BoundedSemaphore(max_workers)
+
+    def try_submit(self, fn: Callable[[], T]) -> Optional[Future]:
+        """Starts ``fn`` on a free worker, or returns None if every worker is busy."""
+        if not self._slots.acquire(blocking=False):
+            return None
+        try:
+            future = self._executor.submit(fn)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+
+_hedge_pools: Dict[str, HedgePool] = {}
+_hedge_pools_lock = threading.Lock()
+
+
+def get_hedge_pool(name: str) -> HedgePool:
+    """Returns the process-wide hedge pool for a provider, creating it on first use."""
+    with _hedge_pools_lock:
+        if name not in _hedge_pools:
+            _hedge_pools[name] = HedgePool(name)
+        return _hedge_pools[name]
+
+
+def hedged_call(fn: Callable[[], T], timeout: float, hedge_after: float, pool: str,
+                max_attempts: int = 2, may_hedge: Optional[Callable[[], bool]] = None) -> T:
+    """
+    Calls ``fn`` and, if it hasn't answered within ``hedge_after`` seconds, fires a duplicate.
+    The first successful result wins; losers finish in the background on the provider's pool.
+    When the provider's pool is busy, the call runs on the caller's thread without hedging.
+
+    Only use this for idempotent calls.
+
+    Args:
+        fn (Callable[[], T]): Zero-argument callable performing the request
+        timeout (float): Overall number of seconds to wait for any attempt
+        hedge_after (float): Seconds to wait before each additional attempt
+        pool (str): Provider whose hedge pool runs the attempts
+        max_attempts (int): Maximum number of concurrent attempts
+        may_hedge (Optional[Callable[[], bool]]): Asked before each additional attempt, e.g. to take
+            a rate limit token for it; no duplicate is sent when it returns False
+
+    Returns:
+        T: Result of the first attempt to succeed
+
+    Raises:
+        TimeoutError: If no attempt succeeds within ``timeout``
+        Exception: The last attempt's error if every attempt failed
+    """
+    hedge_pool = get_hedge_pool(pool)
+    deadline = time.monotonic() + timeout
+    first = hedge_pool.try_submit(fn)
+    if first is None:
+        return fn()
+    pending = {first}
+    attempts = 1
+    last_error: Optional[BaseException] = None
+
+    while pending:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        wait_for = min(remaining, hedge_after) if attempts < max_attempts else remaining
+        done, pending = wait(pending, timeout=wait_for, return_when=FIRST_COMPLETED)
+
+        for future in done:
+            if future.exception() is None:
+                return future.result()
+            last_error = future.exception()
+
+        if attempts < max_attempts and (not done or not pending) and (may_hedge is None or may_hedge()):
+            hedge = hedge_pool.try_submit(fn)
+            if hedge is not None:
+                pending.add(hedge)
+                attempts += 1
+
+    if last_error is not None and not pending:
+        raise last_error
+    raise TimeoutError(f"No response within {timeout:.1f}s after {attempts} attempt(s)")
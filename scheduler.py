@@ -0,0 +1,323 @@
+import enum
+import itertools
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Dict, Hashable, List, Mapping, Optional, TypeVar
+
+T = TypeVar("T")
+
+# Sustained requests per second and burst size per provider, kept under each provider's published limits.
+# Providers not listed are not rate limited.
+DEFAULT_RATE_LIMITS = {
+    "assemblyai": (5.0, 10),
+    "openai-whisper": (5.0, 10),
+    "elevenlabs": (4.0, 8),
+    "openai-tts": (5.0, 10),
+    "openai": (10.0, 20),
+    "recommendations": (20.0, 40),
+}
+# Seconds a provider's bucket is drained for after it answers 429 without a Retry-After header
+DEFAULT_THROTTLE_SECONDS = 1.0
+
+
+class Priority(enum.IntEnum):
+    """Admission priority of a provider call; lower values are admitted first."""
+    INTERACTIVE = 0
+    PREFETCH = 1
+    WARMUP = 2
+
+
+class AdmissionRejected(Exception):
+    """Raised when a call could not be admitted to its provider before its timeout, or was shed."""
+
+
+class TokenBucket:
+    """
+    Token bucket refilled continuously at ``rate`` tokens per second up to ``burst`` tokens.
+    Not thread-safe; ProviderQueue guards it with its own lock.
+    """
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self._updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def take(self) -> bool:
+        """Takes one token if available."""
+        self._refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def wait_time(self) -> float:
+        """Seconds until the next token is available."""
+        self._refill()
+        return max(0.0, (1 - self.tokens) / self.rate)
+
+    def drain(self, seconds: float):
+        """Empties the bucket so no token is available for roughly ``seconds``."""
+        self._refill()
+        self.tokens = min(self.tokens, 0.0) - seconds * self.rate
+
+
+class Call:
+    """
+    A logical provider call; requests coalesced onto it raise its priority while it waits.
+
+    Attributes:
+        - priority: Highest priority of any request waiting on this call
+        - future: Resolves to the call's result for every coalesced request
+        - queue: ProviderQueue the call is waiting in for admission, if any
+    """
+    _sequence = itertools.count()
+
+    def __init__(self, priority: Priority):
+        self.priority = priority
+        self.future: Future = Future()
+        self.order = next(self._sequence)
+        self.queue: Optional["ProviderQueue"] = None
+
+
+class ProviderQueue:
+    """
+    Admission queue for one provider. Waiting calls are admitted one token at a time,
+    highest priority first, then in arrival order.
+
+    Attributes:
+        - name: Provider name
+        - bucket: Rate limit, or None if the provider isn't limited
+        - max_queued: Calls below INTERACTIVE priority are shed once this many are waiting
+    """
+    def __init__(self, name: str, bucket: Optional[TokenBucket], max_queued: int = 32):
+        self.name = name
+        self.bucket = bucket
+        self.max_queued = max_queued
+        self._condition = threading.Condition()
+        self._waiting: List[Call] = []
+        self.in_flight = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.throttled = 0
+        self.hedged = 0
+        self._wait_seconds = 0.0
+
+    def _head(self) -> Call:
+        return min(self._waiting, key=lambda call: (call.priority, call.order))
+
+    def acquire(self, call: Call, timeout: float):
+        """
+        Blocks until the call may be sent to the provider.
+
+        Args:
+            call (Call): Call to admit
+            timeout (float): Seconds to wait for admission
+
+        Raises:
+            AdmissionRejected: If the call was shed or not admitted in time
+        """
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            if call.priority > Priority.INTERACTIVE and len(self._waiting) >= self.max_queued:
+                self.rejected += 1
+                raise AdmissionRejected(f"{self.name} queue is full, shedding {call.priority.name.lower()} call")
+
+            started = time.monotonic()
+            self._waiting.append(call)
+            call.queue = self
+            try:
+                while True:
+                    if self._head() is call and (self.bucket is None or self.bucket.take()):
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.rejected += 1
+                        raise AdmissionRejected(f"{self.name} did not admit call within {timeout:.1f}s")
+                    # The head sleeps until its token is due; everyone else until the head changes
+                    wait = self.bucket.wait_time() if self._head() is call and self.bucket else remaining
+                    self._condition.wait(min(wait, remaining))
+            finally:
+                self._waiting.remove(call)
+                call.queue = None
+                self._condition.notify_all()
+
+            self.admitted += 1
+            self.in_flight += 1
+            self._wait_seconds += time.monotonic() - started
+
+    def try_acquire(self) -> bool:
+        """
+        Takes a token for an extra request, such as a hedged duplicate, without waiting.
+        Fails if no token is spare or any call is queued, so duplicates never delay queued calls.
+        """
+        with self._condition:
+            if self._waiting or not (self.bucket is None or self.bucket.take()):
+                return False
+            self.hedged += 1
+            return True
+
+    def release(self):
+        with self._condition:
+            self.in_flight -= 1
+
+    def reprioritized(self):
+        """Wakes every waiting call after one's priority changed, so they re-check which is head."""
+        with self._condition:
+            self._condition.notify_all()
+
+    def throttle(self, seconds: float):
+        """Holds back admissions after the provider rate limited us."""
+        with self._condition:
+            self.throttled += 1
+            if self.bucket:
+                self.bucket.drain(seconds)
+
+    def snapshot(self) -> dict:
+        with self._condition:
+            depth = {priority.name.lower(): 0 for priority in Priority}
+            for call in self._waiting:
+                depth[Priority(call.priority).name.lower()] += 1
+            return {
+                "queued": depth,
+                "in_flight": self.in_flight,
+                "admitted": self.admitted,
+                "rejected": self.rejected,
+                "throttled": self.throttled,
+                "hedged": self.hedged,
+                "mean_wait_ms": round(1000 * self._wait_seconds / self.admitted, 1) if self.admitted else 0.0,
+            }
+
+
+class Scheduler:
+    """
+    Process-wide admission control for outbound provider calls. Every session's requests share
+    one token bucket per provider, so bursts queue instead of turning into 429s, and identical
+    requests in flight at the same time are coalesced into one.
+    """
+    def __init__(self, rate_limits: Optional[Mapping[str, tuple]] = None):
+        self.rate_limits = dict(DEFAULT_RATE_LIMITS if rate_limits is None else rate_limits)
+        self._queues: Dict[str, ProviderQueue] = {}
+        self._in_flight: Dict[Hashable, Call] = {}
+        self._lock = threading.Lock()
+        self.coalesced = 0
+
+    def configure(self, provider: str, rate: float, burst: int):
+        """Sets a provider's rate limit, replacing its queue's bucket if the limit changed."""
+        with self._lock:
+            if self.rate_limits.get(provider) == (rate, burst):
+                return
+            self.rate_limits[provider] = (rate, burst)
+            if provider in self._queues:
+                self._queues[provider].bucket = TokenBucket(rate, burst)
+
+    def queue(self, provider: str) -> ProviderQueue:
+        with self._lock:
+            if provider not in self._queues:
+                limit = self.rate_limits.get(provider)
+                self._queues[provider] = ProviderQueue(provider, TokenBucket(*limit) if limit else None)
+            return self._queues[provider]
+
+    def admit(self, provider: str, call: Call, fn: Callable[[], T], timeout: float) -> T:
+        """
+        Runs ``fn`` once the provider admits the call.
+
+        Args:
+            provider (str): Provider name, e.g. "elevenlabs"
+            call (Call): Logical call being made, whose priority decides its place in the queue
+            fn (Callable[[], T]): Sends the request
+            timeout (float): Seconds to wait for admission
+
+        Returns:
+            T: Whatever ``fn`` returns
+
+        Raises:
+            AdmissionRejected: If the call was shed or not admitted in time
+        """
+        provider_queue = self.queue(provider)
+        provider_queue.acquire(call, timeout)
+        try:
+            return fn()
+        except Exception as e:
+            if getattr(getattr(e, "response", None), "status_code", None) == 429:
+                retry_after = e.response.headers.get("Retry-After", "")
+                provider_queue.throttle(float(retry_after) if retry_after.isdigit() else DEFAULT_THROTTLE_SECONDS)
+            raise
+        finally:
+            provider_queue.release()
+
+    def try_admit(self, provider: str) -> bool:
+        """Returns True if the provider has a spare token for an extra request, taking it."""
+        return self.queue(provider).try_acquire()
+
+    def coalesce(self, key: Hashable, fn: Callable[[Call], T], priority: Priority, timeout: float) -> T:
+        """
+        Runs ``fn`` unless an identical call is already in flight, in which case its result is shared.
+
+        Args:
+            key (Hashable): Identifies identical requests
+            fn (Callable[[Call], T]): Makes the call, admitting it through ``admit``
+            priority (Priority): Priority of this request
+            timeout (float): Seconds this request may wait for the result
+
+        Returns:
+            T: Result of the shared call
+        """
+        raised = False
+        with self._lock:
+            call = self._in_flight.get(key)
+            owner = call is None
+            if owner:
+                call = self._in_flight[key] = Call(priority)
+            else:
+                self.coalesced += 1
+                raised = priority < call.priority
+                call.priority = min(call.priority, priority)
+
+        if not owner:
+            waiting_in = call.queue
+            if raised and waiting_in is not None:
+                waiting_in.reprioritized()
+            return call.future.result(timeout=timeout)
+
+        try:
+            result = fn(call)
+            call.future.set_result(result)
+            return result
+        except Exception as e:
+            call.future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+
+    def snapshot(self) -> dict:
+        """Returns queue depth and admission counters per provider."""
+        with self._lock:
+            queues = list(self._queues.values())
+            summary = {"coalesced": self.coalesced, "in_flight_calls": len(self._in_flight)}
+        summary["providers"] = {provider_queue.name: provider_queue.snapshot() for provider_queue in queues}
+        return summary
+
+
+_scheduler = Scheduler()
+
+
+def get_scheduler() -> Scheduler:
+    """Returns the process-wide scheduler."""
+    return _scheduler
+
+
+def configure_rate_limits(limits: Mapping[str, object]):
+    """
+    Applies rate limits from the app secrets, e.g. ``RATE_LIMITS = { elevenlabs = 2.0 }``.
+    A bare number is requests per second with a burst of twice that; a ``[rate, burst]`` pair sets both.
+    """
+    for provider, limit in limits.items():
+        rate, burst = (limit[0], limit[1]) if isinstance(limit, (list, tuple)) else (limit, 2 * limit)
+        _scheduler.configure(provider, float(rate), max(1, int(burst)))
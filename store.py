@@ -0,0 +1,252 @@
+import atexit
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+from contextlib import closing
+from typing import List, Optional
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id TEXT PRIMARY KEY,
+    cart TEXT NOT NULL DEFAULT '[]',
+    last_recommendation TEXT,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS turns (
+    session_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (session_id, seq)
+);
+CREATE TABLE IF NOT EXISTS orders (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    session_id TEXT NOT NULL,
+    items TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+"""
+
+UPSERT_SESSION = """
+INSERT INTO sessions (id, cart, last_recommendation, updated_at) VALUES (?, ?, ?, ?)
+ON CONFLICT(id) DO UPDATE SET cart = excluded.cart, last_recommendation = excluded.last_recommendation,
+    updated_at = excluded.updated_at
+"""
+# Sequence numbers are assigned here rather than by the app, so two tabs on one session never collide;
+# the single writer thread applies turns one at a time
+INSERT_TURN = """
+INSERT INTO turns (session_id, seq, role, content, created_at)
+SELECT ?, COALESCE(MAX(seq), -1) + 1, ?, ?, ? FROM turns WHERE session_id = ?
+"""
+LATEST_TURN_SEQ = "SELECT MAX(seq) FROM turns WHERE session_id = ?"
+INSERT_ORDER = "INSERT INTO orders (session_id, items, created_at) VALUES (?, ?, ?)"
+
+
+class SessionStore:
+    """
+    Embedded SQLite store (WAL mode) for sessions, conversation turns and completed orders.
+    Writes are queued and applied in batches by a background thread so the request path never
+    waits on disk; reads open their own connection, which WAL lets run alongside the writer, and
+    only wait for the queued writes of the session they read.
+
+    Attributes:
+        - path: SQLite database file
+        - batch_size: Most writes applied in one transaction
+        - flush_interval: Seconds the writer waits to fill a batch
+    """
+    def __init__(self, path: str, batch_size: int = 100, flush_interval: float = 0.25):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue()
+        self._closed = False
+        # Queued writes per session, so a read waits for its own session only
+        self._pending = Counter()
+        self._pending_changed = threading.Condition()
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with closing(self._connect()) as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.executescript(SCHEMA)
+
+        self._writer = threading.Thread(target=self._write_behind, name="store-writer", daemon=True)
+        self._writer.start()
+        atexit.register(self.close)
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, timeout=10)
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    def _write_behind(self):
+        connection = self._connect()
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            writes = [item for item in batch if item is not None]
+            seqs = []
+            try:
+                with connection:
+                    for session_id, statement, params, seq in writes:
+                        connection.execute(statement, params)
+                        if seq is not None:
+                            # Only this thread writes, so the latest turn is the one just inserted
+                            seqs.append((seq, connection.execute(LATEST_TURN_SEQ, (session_id,)).fetchone()[0]))
+                for seq, value in seqs:
+                    seq.set_result(value)
+            except Exception as e:
+                print(f"Error writing to session store: {str(e)}")
+                for _, _, _, seq in writes:
+                    if seq is not None and not seq.done():
+                        seq.set_exception(e)
+            finally:
+                with self._pending_changed:
+                    for session_id, _, _, _ in writes:
+                        self._pending[session_id] -= 1
+                        if not self._pending[session_id]:
+                            del self._pending[session_id]
+                    self._pending_changed.notify_all()
+                for _ in batch:
+                    self._queue.task_done()
+
+            if None in batch:
+                connection.close()
+                return
+
+    def _enqueue(self, session_id: str, statement: str, params: tuple, seq: Optional[Future] = None):
+        if self._closed:
+            if seq is not None:
+                seq.set_exception(RuntimeError("Session store is closed"))
+            return
+        with self._pending_changed:
+            self._pending[session_id] += 1
+        self._queue.put((session_id, statement, params, seq))
+
+    def _wait_for_session(self, session_id: str, timeout: float = 2.0):
+        """Waits until the session's queued writes are applied, so a read sees them."""
+        with self._pending_changed:
+            self._pending_changed.wait_for(lambda: not self._pending[session_id], timeout=timeout)
+
+    def save_session(self, session_id: str, cart: List[str], last_recommendation: Optional[List[str]]):
+        """Queues an upsert of the session's cart and last recommendation."""
+        self._enqueue(session_id, UPSERT_SESSION, (
+            session_id, json.dumps(cart),
+            json.dumps(last_recommendation) if last_recommendation is not None else None,
+            time.time()
+        ))
+
+    def append_turn(self, session_id: str, role: str, content: str) -> Future:
+        """
+        Queues one conversation turn, numbered after the session's latest one.
+
+        Returns:
+            Future: Resolves to the turn's sequence number once it is written
+        """
+        seq = Future()
+        self._enqueue(session_id, INSERT_TURN, (session_id, role, content, time.time(), session_id), seq)
+        return seq
+
+    def record_order(self, session_id: str, items: List[str]):
+        """Queues a completed order."""
+        self._enqueue(session_id, INSERT_ORDER, (session_id, json.dumps(items), time.time()))
+
+    def flush(self):
+        """Blocks until every queued write has been applied."""
+        self._queue.join()
+
+    def load_session(self, session_id: str) -> Optional[dict]:
+        """
+        Loads a session's cart and last recommendation.
+
+        Args:
+            session_id (str): Session identifier
+
+        Returns:
+            Optional[dict]: Session fields, or None if the session was never saved
+        """
+        self._wait_for_session(session_id)
+        with closing(self._connect()) as connection:
+            row = connection.execute(
+                "SELECT cart, last_recommendation FROM sessions WHERE id = ?", (session_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            "cart": json.loads(row[0]),
+            "last_recommendation": json.loads(row[1]) if row[1] is not None else None,
+        }
+
+    def count_turns(self, session_id: str, before_seq: Optional[int] = None) -> int:
+        """Returns how many turns a session has, only counting those before ``before_seq`` if given."""
+        self._wait_for_session(session_id)
+        with closing(self._connect()) as connection:
+            if before_seq is None:
+                row = connection.execute("SELECT COUNT(*) FROM turns WHERE session_id = ?", (session_id,)).fetchone()
+            else:
+                row = connection.execute(
+                    "SELECT COUNT(*) FROM turns WHERE session_id = ? AND seq < ?", (session_id, before_seq)
+                ).fetchone()
+        return row[0]
+
+    def load_turns(self, session_id: str, before_seq: Optional[int] = None, limit: int = 20) -> List[dict]:
+        """
+        Loads the most recent turns of a session, oldest first. Paging by sequence number rather
+        than offset keeps pages stable while other tabs append to the same session.
+
+        Args:
+            session_id (str): Session identifier
+            before_seq (Optional[int]): Only load turns before this one, e.g. the oldest already shown
+            limit (int): Most turns to load
+
+        Returns:
+            List[dict]: Turns with "role", "content" and "seq"
+        """
+        self._wait_for_session(session_id)
+        with closing(self._connect()) as connection:
+            if before_seq is None:
+                rows = connection.execute(
+                    "SELECT seq, role, content FROM turns WHERE session_id = ? ORDER BY seq DESC LIMIT ?",
+                    (session_id, limit)
+                ).fetchall()
+            else:
+                rows = connection.execute(
+                    "SELECT seq, role, content FROM turns WHERE session_id = ? AND seq < ? ORDER BY seq DESC LIMIT ?",
+                    (session_id, before_seq, limit)
+                ).fetchall()
+        return [{"role": role, "content": content, "seq": seq} for seq, role, content in reversed(rows)]
+
+    def close(self):
+        """Applies outstanding writes and stops the writer thread."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._writer.join(timeout=5)
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_store(path: str) -> SessionStore:
+    """Returns the process-wide store for a database file, opening it on first use."""
+    with _stores_lock:
+        if path not in _stores:
+            _stores[path] = SessionStore(path)
+        return _stores[path]
@@ -0,0 +1,158 @@
+import sys
+import threading
+import time
+import types
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import resilience
+import providers
+from providers import AssemblyAISTT, FakeTTS, ProviderRouter, ProviderUnavailable, get_router, register_backend
+
+
+class FailingTTS(FakeTTS):
+    """Fake TTS that raises while ``failing`` is set."""
+    def __init__(self, name: str):
+        super().__init__(name=name)
+        self.failing = True
+        self.calls = 0
+
+    def synthesize(self, text: str, timeout: float) -> bytes:
+        self.calls += 1
+        if self.failing:
+            raise RuntimeError(f"{self.name} is down")
+        return super().synthesize(text, timeout)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+def answering_voice(router: ProviderRouter, text: str) -> str:
+    backend, _ = router.call_with_backend("synthesize", text, timeout=2.0)
+    return backend.voice_id
+
+
+def test_registered_names_key_each_backend():
+    register_backend("tts", "fake-a", lambda secrets: FakeTTS())
+    register_backend("tts", "fake-b", lambda secrets: FakeTTS())
+    router = get_router("tts", {"TTS_BACKENDS": "fake-a,fake-b"})
+
+    assert [backend.name for backend in router.backends] == ["fake-a", "fake-b"]
+    assert set(router.snapshot()) == {"fake-a", "fake-b"}
+
+
+def test_calls_go_to_the_first_backend_in_preference_order():
+    router = ProviderRouter("tts-order", [FakeTTS(name="first"), FakeTTS(name="second")])
+    assert [answering_voice(router, f"text {index}") for index in range(3)] == ["first"] * 3
+
+
+def test_fails_over_when_a_backend_raises():
+    failing = FailingTTS("down")
+    router = ProviderRouter("tts-failover", [failing, FakeTTS(name="up")])
+
+    assert answering_voice(router, "hello") == "up"
+    assert failing.calls == 1
+    assert router.snapshot()["down"]["error_rate"] == 1.0
+
+
+def test_raises_when_every_backend_fails():
+    router = ProviderRouter("tts-unavailable", [FailingTTS("down-1"), FailingTTS("down-2")])
+    with pytest.raises(ProviderUnavailable):
+        router.call("synthesize", "hello", timeout=2.0)
+
+
+def test_open_breaker_is_skipped_and_recovers_after_its_reset_timeout(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(resilience, "time", clock)
+    flaky = FailingTTS("flaky")
+    steady = FailingTTS("steady")
+    steady.failing = False
+    router = ProviderRouter("tts-breaker", [flaky, steady])
+    breaker = router.breakers["flaky"]
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+    assert router.snapshot()["flaky"]["circuit"] == "open"
+
+    # The preferred backend is skipped without being called while its circuit is open
+    assert answering_voice(router, "skipped") == "steady"
+    assert flaky.calls == 0
+
+    flaky.failing = False
+    steady.failing = True
+    clock.now += breaker.reset_timeout
+    assert router.snapshot()["flaky"]["circuit"] == "half_open"
+
+    # Once the other backend fails, the half-open trial goes through and closes the circuit
+    assert answering_voice(router, "trial") == "flaky"
+    assert flaky.calls == 1
+    assert router.snapshot()["flaky"]["circuit"] == "closed"
+
+
+def wait_for_probe(router: ProviderRouter, name: str):
+    deadline = time.monotonic() + 5.0
+    while not router.snapshot()[name]["calls"]:
+        assert time.monotonic() < deadline, f"{name} was never probed"
+        time.sleep(0.01)
+
+
+def test_switches_to_a_much_faster_backend_once_it_is_probed():
+    router = ProviderRouter("tts-latency", [FakeTTS(latency=0.2, name="slow"), FakeTTS(name="fast")])
+
+    assert answering_voice(router, "first") == "slow"
+    wait_for_probe(router, "fast")
+    assert [answering_voice(router, f"text {index}") for index in range(5)] == ["fast"] * 5
+
+
+def test_keeps_the_primary_when_another_backend_is_only_slightly_faster():
+    router = ProviderRouter("tts-hysteresis", [FakeTTS(latency=0.05, name="current"), FakeTTS(latency=0.04, name="other")])
+
+    assert answering_voice(router, "first") == "current"
+    wait_for_probe(router, "other")
+    assert [answering_voice(router, f"text {index}") for index in range(5)] == ["current"] * 5
+
+
+def test_idle_backends_are_probed_at_most_once_per_interval():
+    probed = FailingTTS("probed")
+    probed.failing = False
+    router = ProviderRouter("tts-probe-interval", [FakeTTS(name="primary"), probed], probe_interval=60.0)
+    # Keep the probed backend unmeasured so every call would otherwise probe it again
+    router.stats["probed"].max_age = 0.0
+
+    for index in range(5):
+        answering_voice(router, f"text {index}")
+    deadline = time.monotonic() + 5.0
+    while not probed.calls:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    assert probed.calls == 1
+
+
+def test_transcriptions_waiting_for_a_worker_do_not_count_against_the_breaker(monkeypatch):
+    release = threading.Event()
+    transcript = types.SimpleNamespace(status="completed", text="milk")
+    transcriber = types.SimpleNamespace(transcribe=lambda audio_path: release.wait(5.0) and transcript)
+    aai = types.SimpleNamespace(settings=types.SimpleNamespace(api_key=None), TranscriptStatus=types.SimpleNamespace(error="error"),
+                                Transcriber=lambda: transcriber)
+    monkeypatch.setitem(sys.modules, "assemblyai", aai)
+    monkeypatch.setattr(AssemblyAISTT, "_executor", ThreadPoolExecutor(max_workers=1))
+    stt = AssemblyAISTT("key")
+    stt.name = "assemblyai-test"
+    router = ProviderRouter("stt-workers", [stt])
+
+    # Occupy the only worker so the routed call queues behind it
+    busy = AssemblyAISTT._executor.submit(transcriber.transcribe, "busy.wav")
+    for index in range(router.breakers["assemblyai-test"].failure_threshold):
+        with pytest.raises(ProviderUnavailable, match="no free transcription worker"):
+            router.call("transcribe", f"queued {index}.wav", timeout=0.1)
+    assert router.snapshot()["assemblyai-test"]["circuit"] == "closed"
+    assert router.snapshot()["assemblyai-test"]["calls"] == 0
+
+    release.set()
+    busy.result()
+    assert router.call("transcribe", "next.wav", timeout=2.0) == "milk"
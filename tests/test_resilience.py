@@ -0,0 +1,147 @@
+import threading
+
+import pytest
+
+import resilience
+from resilience import CircuitBreaker, DeadlineExceeded, TurnBudget, hedged_call
+
+
+class FakeClock:
+    """Stands in for the time module so budgets and breakers can be stepped deterministically."""
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(resilience, "time", fake)
+    return fake
+
+
+def test_stage_timeout_is_its_share_capped_by_what_is_left(clock):
+    budget = TurnBudget(10.0, shares={"transcribe": 0.5, "tts": 0.3})
+    assert budget.stage_timeout("transcribe") == 5.0
+
+    clock.now += 8.0
+    assert budget.stage_timeout("tts") == 2.0
+
+
+def test_stage_timeout_never_drops_below_the_minimum_while_budget_remains(clock):
+    budget = TurnBudget(10.0, shares={"extract": 0.01}, minimum=0.5)
+    assert budget.stage_timeout("extract") == 0.5
+
+
+def test_exhausted_budget_raises(clock):
+    budget = TurnBudget(10.0)
+    clock.now += 10.0
+    assert budget.remaining() == 0.0
+    with pytest.raises(DeadlineExceeded):
+        budget.stage_timeout("tts")
+
+
+def test_breaker_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_timeout=30.0)
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+
+
+def test_half_open_trial_success_closes_the_breaker(clock):
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=30.0)
+    breaker.record_failure()
+    clock.now += 30.0
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+
+    assert breaker.allow()
+    # Only one trial call is let through while it is outstanding
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow()
+
+
+def test_half_open_trial_failure_reopens_the_breaker(clock):
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=30.0)
+    breaker.record_failure()
+    clock.now += 30.0
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+    clock.now += 29.0
+    assert not breaker.allow()
+    clock.now += 1.0
+    assert breaker.allow()
+
+
+def test_released_trial_lets_the_next_call_try(clock):
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=30.0)
+    breaker.record_failure()
+    clock.now += 30.0
+    assert breaker.allow()
+    breaker.release_trial()
+    assert breaker.allow()
+
+
+def test_hedge_fires_after_hedge_after_and_the_first_success_wins():
+    release_first = threading.Event()
+    attempts = []
+
+    def request():
+        attempt = len(attempts)
+        attempts.append(attempt)
+        if attempt == 0:
+            release_first.wait(5.0)
+            return "first"
+        return "hedge"
+
+    try:
+        assert hedged_call(request, timeout=5.0, hedge_after=0.05, pool="test-hedge") == "hedge"
+    finally:
+        release_first.set()
+    assert attempts == [0, 1]
+
+
+def test_no_hedge_when_the_first_attempt_answers_in_time():
+    attempts = []
+
+    def request():
+        attempts.append(1)
+        return "answer"
+
+    assert hedged_call(request, timeout=5.0, hedge_after=1.0, pool="test-no-hedge") == "answer"
+    assert attempts == [1]
+
+
+def test_hedge_replaces_a_failed_first_attempt():
+    attempts = []
+
+    def request():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise RuntimeError("boom")
+        return "retried"
+
+    assert hedged_call(request, timeout=5.0, hedge_after=1.0, pool="test-failed") == "retried"
+    assert len(attempts) == 2
+
+
+def test_hedge_is_skipped_when_may_hedge_declines():
+    release_first = threading.Event()
+    attempts = []
+
+    def request():
+        attempts.append(1)
+        release_first.wait(5.0)
+        return "first"
+
+    threading.Timer(0.2, release_first.set).start()
+    assert hedged_call(request, timeout=5.0, hedge_after=0.05, pool="test-declined",
+                       may_hedge=lambda: False) == "first"
+    assert attempts == [1]
@@ -0,0 +1,123 @@
+import threading
+import time
+
+from resilience import hedged_call
+from scheduler import AdmissionRejected, Call, Priority, Scheduler
+
+
+def admit_later(scheduler, call, admitted, name, timeout=5.0):
+    def run():
+        try:
+            scheduler.admit("provider", call, lambda: admitted.append((name, time.monotonic())), timeout=timeout)
+        except AdmissionRejected:
+            admitted.append((name, None))
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread
+
+
+def test_calls_are_admitted_by_priority():
+    scheduler = Scheduler({"provider": (10.0, 1)})
+    scheduler.admit("provider", Call(Priority.INTERACTIVE), lambda: None, timeout=1.0)
+
+    admitted = []
+    threads = []
+    for name, priority in [("warmup", Priority.WARMUP), ("prefetch", Priority.PREFETCH),
+                           ("interactive", Priority.INTERACTIVE)]:
+        threads.append(admit_later(scheduler, Call(priority), admitted, name))
+        time.sleep(0.02)
+    for thread in threads:
+        thread.join()
+
+    # Arrival order doesn't matter while the bucket is empty
+    assert [name for name, _ in admitted] == ["interactive", "prefetch", "warmup"]
+
+
+def test_raised_priority_is_admitted_without_stalling_the_queue():
+    scheduler = Scheduler({"provider": (2.0, 1)})
+    scheduler.admit("provider", Call(Priority.INTERACTIVE), lambda: None, timeout=1.0)
+    start = time.monotonic()
+
+    admitted = []
+    prefetch = admit_later(scheduler, Call(Priority.PREFETCH), admitted, "prefetch")
+    time.sleep(0.05)
+    warmup = threading.Thread(target=scheduler.coalesce, args=(
+        "key",
+        lambda call: scheduler.admit("provider", call, lambda: admitted.append(("raised", time.monotonic())),
+                                     timeout=5.0),
+        Priority.WARMUP, 5.0))
+    warmup.start()
+    time.sleep(0.05)
+
+    # A shopper's turn joins the queued warm-up call
+    scheduler.coalesce("key", lambda call: None, Priority.INTERACTIVE, 5.0)
+    warmup.join()
+    prefetch.join()
+
+    times = dict(admitted)
+    assert [name for name, _ in admitted] == ["raised", "prefetch"]
+    assert times["raised"] - start < 0.9
+    assert times["prefetch"] is not None and times["prefetch"] - start < 1.5
+
+
+def test_identical_calls_are_coalesced():
+    scheduler = Scheduler({})
+    calls = []
+
+    def fetch(call):
+        calls.append(call)
+        time.sleep(0.2)
+        return "answer"
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(scheduler.coalesce("key", fetch, Priority.PREFETCH, 2.0)))
+               for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == ["answer"] * 5
+    assert len(calls) == 1
+    assert scheduler.snapshot()["coalesced"] == 4
+
+
+def test_low_priority_calls_are_shed_when_the_queue_is_full():
+    scheduler = Scheduler({"provider": (0.5, 1)})
+    provider_queue = scheduler.queue("provider")
+    provider_queue.max_queued = 1
+    scheduler.admit("provider", Call(Priority.INTERACTIVE), lambda: None, timeout=1.0)
+
+    admitted = []
+    waiting = admit_later(scheduler, Call(Priority.INTERACTIVE), admitted, "interactive", timeout=3.0)
+    time.sleep(0.05)
+    try:
+        scheduler.admit("provider", Call(Priority.PREFETCH), lambda: None, timeout=3.0)
+        shed = False
+    except AdmissionRejected:
+        shed = True
+    waiting.join()
+
+    assert shed
+    assert provider_queue.snapshot()["rejected"] == 1
+
+
+def test_hedged_duplicates_take_their_own_token():
+    for burst, expected_requests in [(1, 1), (2, 2)]:
+        scheduler = Scheduler({"provider": (0.1, burst)})
+        sent = []
+
+        def request():
+            sent.append(time.monotonic())
+            time.sleep(0.3)
+            return "answer"
+
+        result = scheduler.admit(
+            "provider", Call(Priority.INTERACTIVE),
+            lambda: hedged_call(request, timeout=2.0, hedge_after=0.05, pool="test",
+                                may_hedge=lambda: scheduler.try_admit("provider")),
+            timeout=1.0)
+
+        assert result == "answer"
+        assert len(sent) == expected_requests
+        assert scheduler.snapshot()["providers"]["provider"]["hedged"] == expected_requests - 1
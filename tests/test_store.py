@@ -0,0 +1,73 @@
+import time
+
+import pytest
+
+from store import SessionStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = SessionStore(str(tmp_path / "sessions" / "echo.db"), flush_interval=0.05)
+    yield store
+    store.close()
+
+
+def append_turns(store: SessionStore, session_id: str, count: int, start: int = 0) -> list:
+    return [store.append_turn(session_id, "user", f"turn {index}") for index in range(start, start + count)]
+
+
+def test_turns_are_numbered_by_the_database_per_session(store):
+    # Two tabs on one session append without knowing each other's turns
+    first_tab = store.append_turn("shared", "user", "milk")
+    second_tab = store.append_turn("shared", "user", "eggs")
+    other = store.append_turn("other", "user", "bread")
+
+    assert [first_tab.result(timeout=2.0), second_tab.result(timeout=2.0)] == [0, 1]
+    assert other.result(timeout=2.0) == 0
+    assert [turn["seq"] for turn in store.load_turns("shared")] == [0, 1]
+
+
+def test_reads_wait_only_for_their_own_sessions_writes(tmp_path):
+    store = SessionStore(str(tmp_path / "echo.db"), flush_interval=1.0)
+    try:
+        store.save_session("busy", ["milk"], None)
+
+        started = time.monotonic()
+        assert store.load_session("idle") is None
+        assert time.monotonic() - started < 0.5
+
+        # The busy session's read waits for its queued write instead of missing it
+        assert store.load_session("busy") == {"cart": ["milk"], "last_recommendation": None}
+    finally:
+        store.close()
+
+
+def test_pages_back_by_sequence_number(store):
+    append_turns(store, "session", 25)
+
+    latest = store.load_turns("session", limit=10)
+    assert [turn["seq"] for turn in latest] == list(range(15, 25))
+
+    # Another tab appending between pages doesn't shift the next page
+    append_turns(store, "session", 3, start=25)
+    earlier = store.load_turns("session", before_seq=latest[0]["seq"], limit=10)
+    assert [turn["content"] for turn in earlier] == [f"turn {index}" for index in range(5, 15)]
+    assert store.count_turns("session", before_seq=earlier[0]["seq"]) == 5
+    assert store.count_turns("session") == 28
+
+
+def test_reopened_store_keeps_sessions_and_continues_numbering(tmp_path):
+    path = str(tmp_path / "echo.db")
+    store = SessionStore(path)
+    store.save_session("session", ["milk", "eggs"], ["bread"])
+    append_turns(store, "session", 2)
+    store.record_order("session", ["milk", "eggs"])
+    store.close()
+
+    reopened = SessionStore(path)
+    try:
+        assert reopened.load_session("session") == {"cart": ["milk", "eggs"], "last_recommendation": ["bread"]}
+        assert reopened.append_turn("session", "assistant", "anything else?").result(timeout=2.0) == 2
+        assert [turn["content"] for turn in reopened.load_turns("session")] == ["turn 0", "turn 1", "anything else?"]
+    finally:
+        reopened.close()
@@ -0,0 +1,33 @@
+from utils import DataMapping, Responses
+
+
+def test_filler_names_every_product():
+    assert Responses.filler(["Milk"]) == "Looking up milk for you."
+    assert Responses.filler(["Milk", "Eggs", "Jam"]) == "Looking up milk, eggs and jam for you."
+
+
+def test_filler_segments_keep_the_template_phrases_separate():
+    assert Responses.filler_segments(["Milk"]) == ["Looking up", "milk", "for you."]
+    assert Responses.filler_segments(["Milk", "Eggs", "Jam"]) == ["Looking up", "milk", "eggs", "and", "jam", "for you."]
+
+
+def test_split_shopping_list_assigns_items_to_the_first_matching_product():
+    recommendations = {
+        "Milk": ["Milk Classic", "Chocolate Milk", "Butter"],
+        "Chocolate": ["Chocolate Milk", "Dark Chocolate", "butter"],
+    }
+    matching, not_matching = DataMapping.split_shopping_list(recommendations)
+
+    assert matching == {"Milk": ["Milk Classic", "Chocolate Milk"], "Chocolate": ["Dark Chocolate"]}
+    assert not_matching == ["Butter"]
+
+
+def test_split_shopping_list_keeps_products_without_matches():
+    matching, not_matching = DataMapping.split_shopping_list({"Jam": ["Butter", "Bread"]})
+    assert matching == {"Jam": []}
+    assert not_matching == ["Butter", "Bread"]
+
+
+def test_merge_recommendations_drops_case_insensitive_duplicates_in_first_seen_order():
+    merged = DataMapping.merge_recommendations({"Milk": ["Milk Classic", "Butter"], "Bread": ["butter", "Rye Bread"]})
+    assert merged == ["Milk Classic", "Butter", "Rye Bread"]
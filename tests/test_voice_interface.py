@@ -0,0 +1,20 @@
+import pytest
+
+from voice_interface import VoiceInterface
+
+
+@pytest.mark.parametrize("reply, expected", [
+    ('["milk", "brown bread"]', ["milk", "brown bread"]),
+    ('```json\n["milk","eggs"]\n```', ["milk", "eggs"]),
+    ('"milk"', ["milk"]),
+    ('[]', []),
+    ('none', []),
+    ('{"item": "milk"}', []),
+    ('42', []),
+    ('["Milk", "milk"]', ["Milk"]),
+    ("milk, bread and eggs", ["milk", "bread", "eggs"]),
+    ("bread and butter", ["bread and butter"]),
+    ("milk", ["milk"]),
+])
+def test_parse_item_names(reply, expected):
+    assert VoiceInterface.parse_item_names(reply) == expected
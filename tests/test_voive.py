@@ -0,0 +1,113 @@
+import asyncio
+import sys
+import types
+
+import numpy as np
+
+# The recorder only needs pyaudio's constants here; no audio device is opened
+sys.modules.setdefault("pyaudio", types.SimpleNamespace(
+    paInt8=16, paInt16=8, paInt32=2, paFloat32=1, paContinue=0, paComplete=1, paAbort=2))
+
+from voive import CallbackRecorder, EnergyVAD, RingBuffer, StreamParams, SyntheticStream  # noqa: E402
+
+RATE = 1000
+PARAMS = StreamParams(channels=1, rate=RATE, frames_per_buffer=100)
+
+
+class IdleStream:
+    """Stream that never calls back on its own; tests push audio with CallbackRecorder.feed."""
+    def __init__(self, callback):
+        self.active = False
+
+    def start_stream(self):
+        self.active = True
+
+    def is_active(self) -> bool:
+        return self.active
+
+    def stop_stream(self):
+        self.active = False
+
+    def close(self):
+        self.active = False
+
+
+def chunk(value: int, frames: int = 100) -> bytes:
+    return np.full((frames, 1), value, dtype=np.int16).tobytes()
+
+
+def test_ring_buffer_overwrites_the_oldest_frames_when_it_wraps():
+    buffer = RingBuffer(4, 1, np.int16)
+    buffer.write(np.arange(3, dtype=np.int16).reshape(-1, 1))
+    buffer.write(np.arange(3, 6, dtype=np.int16).reshape(-1, 1))
+
+    assert buffer.written == 6
+    assert buffer.oldest() == 2
+    assert np.concatenate(buffer.views(2, 6)).ravel().tolist() == [2, 3, 4, 5]
+
+
+def test_ring_buffer_keeps_only_the_tail_of_an_oversized_write():
+    buffer = RingBuffer(4, 1, np.int16)
+    buffer.write(np.arange(10, dtype=np.int16).reshape(-1, 1))
+
+    assert buffer.written == 10
+    assert np.concatenate(buffer.views(buffer.oldest(), 10)).ravel().tolist() == [6, 7, 8, 9]
+
+
+def test_views_split_in_two_only_across_the_end_of_the_buffer():
+    buffer = RingBuffer(4, 1, np.int16)
+    buffer.write(np.arange(6, dtype=np.int16).reshape(-1, 1))
+
+    assert len(buffer.views(4, 6)) == 1
+    first, second = buffer.views(3, 6)
+    assert first.ravel().tolist() == [3]
+    assert second.ravel().tolist() == [4, 5]
+    # Views share memory with the buffer rather than copying it
+    assert np.shares_memory(first, buffer._data)
+
+
+def test_frames_overwritten_before_they_are_read_are_counted_as_dropped():
+    recorder = CallbackRecorder(PARAMS, buffer_seconds=0.2, stream_factory=IdleStream)
+    recorder.start()
+    for value in range(5):
+        recorder.feed(chunk(value))
+    recorder.stop()
+
+    frames = np.concatenate(list(recorder.frames()))
+    assert recorder.dropped_frames == 300
+    assert frames.ravel().tolist() == [3] * 100 + [4] * 100
+
+
+def test_vad_ends_the_recording_after_silence_following_speech():
+    vad = EnergyVAD(RATE, threshold=0.1, silence_duration=0.2, min_speech_duration=0.2)
+    recorder = CallbackRecorder(PARAMS, vad=vad, stream_factory=IdleStream)
+    recorder.start()
+
+    # Silence before speech never ends the recording
+    assert not recorder.feed(chunk(0))
+    assert not any(recorder.feed(chunk(20000)) for _ in range(2))
+    assert not recorder.feed(chunk(0))
+    assert recorder.feed(chunk(0))
+    assert recorder.finished
+
+
+def test_recording_stops_at_max_duration_without_end_of_speech():
+    recorder = CallbackRecorder(PARAMS, stream_factory=IdleStream)
+    recorder.start(max_duration=0.3)
+
+    assert not any(recorder.feed(chunk(20000)) for _ in range(2))
+    assert recorder.feed(chunk(20000))
+    assert recorder.finished
+
+
+def test_frames_can_be_consumed_by_async_iteration():
+    samples = np.arange(1000, dtype=np.int16).reshape(-1, 1)
+    recorder = CallbackRecorder(PARAMS, stream_factory=lambda callback: SyntheticStream(samples, PARAMS, callback))
+
+    async def collect() -> np.ndarray:
+        recorder.start(max_duration=1.0)
+        chunks = [np.copy(view) async for view in recorder]
+        recorder.stop()
+        return np.concatenate(chunks)
+
+    assert np.array_equal(asyncio.run(collect()), samples)
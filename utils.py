@@ -1,4 +1,4 @@
-from typing import List, Tuple
+from typing import Dict, List, Tuple
 from datetime import datetime, timedelta, timezone
 
 class DataMapping:
@@ -34,6 +34,57 @@ class DataMapping:
                 not_matching_all_parts.append(original_item)
 
         return matching_all_parts, not_matching_all_parts
+
+    @staticmethod
+    def split_shopping_list(recommendations: Dict[str, List[str]]) -> Tuple[Dict[str, List[str]], List[str]]:
+        """
+        Splits recommendations for several products into the items matching each product and
+        one deduplicated list of everything else.
+
+        Args:
+            recommendations (Dict[str, List[str]]): Recommendation strings per product name.
+
+        Returns:
+            Tuple[Dict[str, List[str]], List[str]]: Two values:
+                - Matching items per product name, each item listed under the first product it matches.
+                - Items that match none of the products, without duplicates, in first-seen order.
+        """
+        matching_by_product = {}
+        seen = set()
+        not_matching = []
+
+        for product_name, items in recommendations.items():
+            matching, _ = DataMapping.split_list_on_product_name(items, product_name)
+            matching_by_product[product_name] = [item for item in matching if item.lower() not in seen]
+            seen.update(item.lower() for item in matching)
+
+        for items in recommendations.values():
+            for item in items:
+                if item.lower() not in seen:
+                    seen.add(item.lower())
+                    not_matching.append(item)
+
+        return matching_by_product, not_matching
+
+    @staticmethod
+    def merge_recommendations(recommendations: Dict[str, List[str]]) -> List[str]:
+        """
+        Merges recommendations for several products into one list without duplicates.
+
+        Args:
+            recommendations (Dict[str, List[str]]): Recommendation strings per product name.
+
+        Returns:
+            List[str]: All recommended items, in first-seen order.
+        """
+        merged = []
+        seen = set()
+        for items in recommendations.values():
+            for item in items:
+                if item.lower() not in seen:
+                    seen.add(item.lower())
+                    merged.append(item)
+        return merged
     
 class Responses:
     @staticmethod
@@ -70,6 +121,125 @@ class Responses:
         non_matched_items = ", ".join(not_matching)
         return f"Apart from the items I recommended, here are other items that you might be interested in buying: {non_matched_items}."
     
+    @staticmethod
+    def shopping_list(matching_by_product: Dict[str, List[str]]) -> str:
+        """
+        Generates one response covering every product the user asked for.
+
+        Args:
+            matching_by_product (Dict[str, List[str]]): Matched item names per requested product.
+
+        Returns:
+            str: Response message for the whole shopping list.
+        """
+        if len(matching_by_product) == 1:
+            return Responses.matching_list(next(iter(matching_by_product.values())))
+
+        found = [f"for {product.lower()}: {', '.join(items)}" for product, items in matching_by_product.items() if items]
+        missing = [product.lower() for product, items in matching_by_product.items() if not items]
+
+        if not found:
+            return "I couldn't find any items matching your request. Let me know if you'd like me to try again!"
+
+        response = f"Here are the items that you requested, {'; '.join(found)}."
+        if missing:
+            response += f" I couldn't find anything for {', '.join(missing)}."
+        return response + " Let me know if you're interested in adding these to your cart."
+
+    @staticmethod
+    def matching_list_segments(matching: List[str]) -> List[str]:
+        """
+        Splits the matching items response into template phrases and one segment per item name,
+        so each piece can be synthesized and cached on its own.
+
+        Args:
+            matching (List[str]): List of matched item names.
+
+        Returns:
+            List[str]: Segments that read as the matching_list response when played in order.
+        """
+        if not matching:
+            return [Responses.matching_list(matching)]
+
+        return ["Here are the items that you requested:", *matching,
+                "Let me know if you're interested in adding these to your cart."]
+
+    @staticmethod
+    def not_matching_list_segments(not_matching: List[str]) -> List[str]:
+        """
+        Splits the not-matching items response into template phrases and one segment per item name.
+
+        Args:
+            not_matching (List[str]): List of not-matching item names.
+
+        Returns:
+            List[str]: Segments that read as the not_matching_list response when played in order.
+        """
+        if not not_matching:
+            return [Responses.not_matching_list(not_matching)]
+
+        return ["Apart from the items I recommended, here are other items that you might be interested in buying:",
+                *not_matching]
+
+    @staticmethod
+    def shopping_list_segments(matching_by_product: Dict[str, List[str]]) -> List[str]:
+        """
+        Splits the shopping list response into template phrases and one segment per item name.
+
+        Args:
+            matching_by_product (Dict[str, List[str]]): Matched item names per requested product.
+
+        Returns:
+            List[str]: Segments that read as the shopping_list response when played in order.
+        """
+        if len(matching_by_product) == 1:
+            return Responses.matching_list_segments(next(iter(matching_by_product.values())))
+
+        if not any(matching_by_product.values()):
+            return [Responses.shopping_list(matching_by_product)]
+
+        segments = ["Here are the items that you requested."]
+        for product, items in matching_by_product.items():
+            if items:
+                segments += [f"For {product.lower()}:", *items]
+
+        missing = [product.lower() for product, items in matching_by_product.items() if not items]
+        if missing:
+            segments += ["I couldn't find anything for", *missing]
+        return segments + ["Let me know if you're interested in adding these to your cart."]
+
+    @staticmethod
+    def filler(products: List[str]) -> str:
+        """
+        Generates the short phrase played while recommendations are being looked up.
+
+        Args:
+            products (List[str]): Product names being looked up.
+
+        Returns:
+            str: Filler message naming the products.
+        """
+        names = [product.lower() for product in products]
+        if len(names) > 1:
+            names = [", ".join(names[:-1]) + " and " + names[-1]]
+        return f"Looking up {names[0]} for you."
+
+    @staticmethod
+    def filler_segments(products: List[str]) -> List[str]:
+        """
+        Splits the filler message into template phrases and one segment per product name.
+
+        Args:
+            products (List[str]): Product names being looked up.
+
+        Returns:
+            List[str]: Segments that read as the filler message when played in order.
+        """
+        names = [product.lower() for product in products]
+        if len(names) > 1:
+            names = [*names[:-1], "and", names[-1]]
+        return ["Looking up", *names, "for you."]
+
     @staticmethod
     def greeting_based_on_time() -> str:
         """
@@ -1,129 +1,158 @@
 import os
-import time
+import hashlib
+import re
+import json
+import threading
 import tempfile
-import sounddevice as sd
-import soundfile as sf
-import requests
 from dotenv import load_dotenv
-import assemblyai as aai
-from openai import OpenAI
 import os
-from typing import Optional
+from typing import List, Optional
 import streamlit as st
+from cachetools import LRUCache
+from providers import ELEVENLABS_VOICES, get_router
+from scheduler import Priority
 
 # Load environment variables
 load_dotenv(override=True)
 
+# Timeouts used when a caller doesn't pass a turn budget
+DEFAULT_STT_TIMEOUT = 30.0
+DEFAULT_LLM_TIMEOUT = 10.0
+DEFAULT_TTS_TIMEOUT = 15.0
+
+CANNED_ORDER_FALLBACK = "I apologize, but I couldn't understand your response. Could you please try again?"
+ORDER_PLACED_RESPONSE = "Thank you for shopping with us, your order has been placed. See you next time"
+ORDER_DECLINED_RESPONSE = "Let me know if you would like some recommendations on other items you are considering to buy"
+
+# Synthesized audio per (voice, text), shared across sessions and also served when every TTS backend is unavailable
+_tts_cache = LRUCache(maxsize=512)
+_tts_cache_lock = threading.Lock()
+
 class VoiceInterface:
     def __init__(self):
-        """Initialize the voice interface with API keys and audio settings."""
-        # Load API keys from environment
-        self.assemblyai_api_key = st.secrets['ASSEMBLYAI_API_KEY']
-        self.elevenlabs_api_key = st.secrets['ELEVENLABS_API_KEY']
+        """Initialize the voice interface with the configured speech and language backends."""
+        # Routers pick the fastest healthy backend per capability; they are shared across sessions
+        self.stt = get_router("stt", st.secrets)
+        self.tts = get_router("tts", st.secrets)
+        self.llm = get_router("llm", st.secrets)
         
-        if not self.assemblyai_api_key or not self.elevenlabs_api_key:
-            raise ValueError("Missing required API keys in environment variables")
-            
-        # Initialize AssemblyAI
-        aai.settings.api_key = self.assemblyai_api_key
-        self.transcriber = aai.Transcriber()
+        # Recordings and synthesized speech are written here; created if it doesn't exist
+        self.recordings_dir = st.secrets.get("RECORDINGS_DIR", "recordings")
+        os.makedirs(self.recordings_dir, exist_ok=True)
         
-        # Create recordings directory if it doesn't exist
-        os.makedirs("recordings", exist_ok=True)
-        
-        # ElevenLabs API settings
-        self.tts_url = "https://api.elevenlabs.io/v1/text-to-speech"
-        self.voice_options = {
-        "rachel": "Xb7hH8MSUJpSbSDYk0k2",    # Rachel
-        "domi": "pqHfZKP75CvOlQylNhV4	",      # Domi
-        "bella": "9BWtsMINqrJLrRacOk9x",     # Bella
-        "antoni": "nPczCjzI2devNBz1zQrb",     # Antoni
-        "elli": "pFZP5JQG7iQjIQuC4Bku",      # Elli
-       # Sam
-        }
-        self.voice_id = self.voice_options["rachel"]
-        # self.voice_id = "21m00Tcm4TlvDq8ikWAM"  # Josh voice
+        self.voice_options = ELEVENLABS_VOICES
+
+    @property
+    def voice_id(self) -> str:
+        """Voice of the TTS backend currently preferred by the router."""
+        return self.tts.primary.voice_id
 
-    def transcribe_audio(self, audio_path: str) -> str:
+    def transcribe_audio(self, audio_path: str, timeout: Optional[float] = None) -> str:
         """
-        Transcribe audio file using AssemblyAI.
+        Transcribe audio file using the fastest healthy speech-to-text backend.
         
         Args:
             audio_path (str): Path to the audio file
+            timeout (Optional[float]): Seconds to wait for the transcript before giving up
             
         Returns:
             str: Transcribed text or None if failed
         """
         try:
             print(f"Transcribing audio file: {audio_path}")
-            transcript = self.transcriber.transcribe(audio_path)
-            
-            if transcript.status == aai.TranscriptStatus.error:
-                print(f"Transcription error: {transcript.error}")
-                return None
+            text = self.stt.call("transcribe", audio_path, timeout=timeout or DEFAULT_STT_TIMEOUT)
             
-            print(f"Transcription successful: {transcript.text}")
-            return transcript.text
+            print(f"Transcription successful: {text}")
+            return text
             
         except Exception as e:
             print(f"Error in transcription: {str(e)}")
             return None
     
-    def extract_item_name(self, sentence: str) -> Optional[str]:
+    def extract_item_name(self, sentence: str, timeout: Optional[float] = None) -> Optional[str]:
         """
-        Extract item name from a sentence using OpenAI's API.
+        Extract the main item name from a sentence using the language model.
         
         Args:
             sentence (str): Input sentence containing item mention
+            timeout (Optional[float]): Seconds the API call may take
             
         Returns:
             Optional[str]: Extracted item name or None if extraction fails
 
         """
-        # print(f"API Key being used: {os.getenv('OPENAI_API_KEY')}")
-        try:
-            # Initialize OpenAI client
-            client = OpenAI(api_key=st.secrets['OPENAI_API_KEY'])
+        item_names = self.extract_item_names(sentence, timeout=timeout)
+        return item_names[0] if item_names else None
+
+    def extract_item_names(self, sentence: str, timeout: Optional[float] = None) -> List[str]:
+        """
+        Extract every item name mentioned in a sentence using the language model.
+        
+        Args:
+            sentence (str): Input sentence containing one or more item mentions
+            timeout (Optional[float]): Seconds the API call may take
             
+        Returns:
+            List[str]: Extracted item names in the order they were mentioned, empty if none
+                were found or extraction fails
+
+        """
+        try:
             # Construct the prompt
             prompt = f"""
-            Extract only the item or product name from the following sentence. Return only the item name, nothing else.
-            If multiple items are mentioned, return the main item being referred to.
-            If no item is found, return "None".
+            Extract every item or product name from the following sentence.
+            Return a JSON array of item names, e.g. ["milk", "brown bread"], nothing else.
+            If no item is found, return [].
 
             Sentence: "{sentence}"
             """
             
             # Make the API call
-            response = client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are a helpful assistant that extracts item names from sentences. Return only the item name, no additional text."
-                    },
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ],
-                temperature=0,  # Use 0 for consistent responses
-                max_tokens=50   # Limit response length
+            content = self.llm.call(
+                "complete",
+                "You are a helpful assistant that extracts item names from sentences. Return only a JSON array of item names, no additional text.",
+                prompt,
+                max_tokens=150,  # Limit response length
+                timeout=timeout or DEFAULT_LLM_TIMEOUT
             )
-            
-            # Get the extracted item
-            extracted_item = response.choices[0].message.content.strip()
-            
-            # Return None if no item was found
-            if extracted_item.lower() == 'none':
-                return None
-                
-            return extracted_item
+            return self.parse_item_names(content)
             
         except Exception as e:
-            print(f"Error extracting item name: {str(e)}")
-            return None
+            print(f"Error extracting item names: {str(e)}")
+            return []
         
+    @staticmethod
+    def parse_item_names(content: str) -> List[str]:
+        """
+        Parses the language model's answer to the item extraction prompt.
+
+        Args:
+            content (str): Model reply, ideally a JSON array of item names
+
+        Returns:
+            List[str]: Item names without duplicates, in the order given
+        """
+        # Models sometimes wrap the array in a markdown code fence
+        content = re.sub(r"^```[a-z]*\s*|\s*```$", "", content.strip())
+        try:
+            extracted_items = json.loads(content)
+        except json.JSONDecodeError:
+            # Fall back to a plain answer such as "milk, bread and eggs". "and" only separates
+            # items in a list, so "bread and butter" on its own stays one product.
+            plain = content.strip("[]")
+            extracted_items = re.split(r",|\band\b", plain) if "," in plain else [plain]
+        if isinstance(extracted_items, str):
+            extracted_items = [extracted_items]
+        elif not isinstance(extracted_items, list):
+            extracted_items = []
+
+        item_names = []
+        for item in extracted_items:
+            item = str(item).strip().strip('"\'')
+            if item and item.lower() != 'none' and item.lower() not in [name.lower() for name in item_names]:
+                item_names.append(item)
+        return item_names
+
     def capitalize_word(self, word: str) -> str:
         """
         Capitalizes first letter of word and handles special cases.
@@ -172,91 +201,93 @@ class VoiceInterface:
         items_str = ", ".join(item_list)
         return f"Here are some items I recommend: [{items_str}]. Let me know if you'd like to add any of these to your cart!"
     
-    def check_order_intent(self, response: str) -> str:
+    def check_order_intent(self, response: str, timeout: Optional[float] = None) -> str:
         """
         Analyzes user's response to determine if they want to place an order.
         
         Args:
             response (str): User's response text
+            timeout (Optional[float]): Seconds the API call may take
             
         Returns:
             str: Appropriate response message
         """
         try:
-            client = OpenAI(api_key=st.secrets['OPENAI_API_KEY'])
-            
             prompt = f"""
             Analyze if this response indicates a positive intent to order/buy (yes) or negative (no).
             Return only 'yes' or 'no'.
             Response: "{response}"
             """
             
-            completion = client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {"role": "system", "content": "You are a classifier that determines if a customer wants to place an order. Respond with only 'yes' or 'no'."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0
-            )
-            
-            intent = completion.choices[0].message.content.strip().lower()
+            intent = self.llm.call(
+                "complete",
+                "You are a classifier that determines if a customer wants to place an order. Respond with only 'yes' or 'no'.",
+                prompt,
+                max_tokens=None,
+                timeout=timeout or DEFAULT_LLM_TIMEOUT
+            ).lower()
             
             if intent == 'yes':
-                return "Thank you for shopping with us, your order has been placed. See you next time"
+                return ORDER_PLACED_RESPONSE
             else:
-                return "Let me know if you would like some recommendations on other items you are considering to buy"
+                return ORDER_DECLINED_RESPONSE
                 
         except Exception as e:
             print(f"Error checking order intent: {str(e)}")
-            return "I apologize, but I couldn't understand your response. Could you please try again?"
+            return CANNED_ORDER_FALLBACK
     
-    def text_to_speech(self, text: str) -> Optional[str]:
+    def cached_speech(self, text: str) -> Optional[str]:
+        """
+        Looks up previously synthesized audio for a text in the current voice.
+
+        Args:
+            text (str): Text that was converted to speech
+
+        Returns:
+            Optional[str]: Path to the cached audio file or None if it isn't cached
         """
-        Convert text to speech using ElevenLabs.
+        with _tts_cache_lock:
+            tts_path = _tts_cache.get((self.voice_id, text))
+        if tts_path and os.path.exists(tts_path):
+            return tts_path
+        return None
+
+    def text_to_speech(self, text: str, timeout: Optional[float] = None,
+                       priority: Priority = Priority.INTERACTIVE) -> Optional[str]:
+        """
+        Convert text to speech using the fastest healthy text-to-speech backend.
         
         Args:
             text (str): Text to convert to speech
+            timeout (Optional[float]): Seconds synthesis may take, including failover
+            priority (Priority): Admission priority against other sessions' provider calls
             
         Returns:
-            Optional[str]: Path to generated audio file or None if failed
+            Optional[str]: Path to generated or cached audio file or None if failed
         """
+        cached_path = self.cached_speech(text)
+        if cached_path:
+            return cached_path
+
         try:
-            url = f"{self.tts_url}/{self.voice_id}"
-            
-            headers = {
-                "Accept": "audio/mpeg",
-                "Content-Type": "application/json",
-                "xi-api-key": self.elevenlabs_api_key
-            }
+            print("Generating speech...")
+            backend, audio = self.tts.call_with_backend(
+                "synthesize", text, timeout=timeout or DEFAULT_TTS_TIMEOUT, priority=priority)
+            # Cached under the voice that actually spoke, which differs from the primary's after a failover
+            voice_id = backend.voice_id
             
-            data = {
-                "text": text,
-                "model_id": "eleven_monolingual_v1",
-                "voice_settings": {
-                    "stability": 0.5,
-                    "similarity_boost": 0.5
-                }
-            }
+            print("Speech generated successfully")
+            # Name files by content so concurrent syntheses never overwrite each other
+            digest = hashlib.sha1(f"{voice_id}:{text}".encode("utf-8")).hexdigest()[:16]
+            tts_path = os.path.join(self.recordings_dir, f"tts_response_{digest}.mp3")
             
-            print("Generating speech...")
-            response = requests.post(url, json=data, headers=headers)
+            # Save the audio response
+            with open(tts_path, 'wb') as audio_file:
+                audio_file.write(audio)
             
-            if response.status_code == 200:
-                print("Speech generated successfully")
-                timestamp = time.strftime("%Y%m%d-%H%M%S")
-                tts_path = os.path.join("recordings", f"tts_response_{timestamp}.mp3")
-                
-                # Save the audio response
-                with open(tts_path, 'wb') as audio_file:
-                    audio_file.write(response.content)
-                
-                return tts_path
-                
-            else:
-                print(f"Error: Received status code {response.status_code} from ElevenLabs API")
-                print(f"Response: {response.text}")
-                return None
+            with _tts_cache_lock:
+                _tts_cache[(voice_id, text)] = tts_path
+            return tts_path
                 
         except Exception as e:
             print(f"Error in text to speech: {str(e)}")
@@ -1,8 +1,20 @@
+import asyncio
+import threading
+import time
 import wave
 from dataclasses import dataclass, asdict
+from typing import Callable, Iterator, Optional
 
+import numpy as np
 import pyaudio
 
+SAMPLE_DTYPES = {
+    pyaudio.paInt8: np.int8,
+    pyaudio.paInt16: np.int16,
+    pyaudio.paInt32: np.int32,
+    pyaudio.paFloat32: np.float32,
+}
+
 
 @dataclass
 class StreamParams:
@@ -16,6 +28,10 @@ class StreamParams:
     def to_dict(self) -> dict:
         return asdict(self)
 
+    @property
+    def dtype(self) -> np.dtype:
+        return np.dtype(SAMPLE_DTYPES[self.format])
+
 
 class Recorder:
     """Recorder uses the blocking I/O facility from pyaudio to record sound
@@ -65,6 +81,293 @@ class Recorder:
         self._pyaudio.terminate()
 
 
+class RingBuffer:
+    """Preallocated ring buffer of audio frames (rows of samples, one column
+    per channel). Readers get views into the buffer instead of copies, so a
+    view is only valid until the writer wraps around and overwrites it.
+
+    Attributes:
+        - capacity: Number of frames the buffer holds
+        - written: Total number of frames ever written
+    """
+    def __init__(self, capacity: int, channels: int, dtype: np.dtype) -> None:
+        self.capacity = capacity
+        self.written = 0
+        self._data = np.zeros((capacity, channels), dtype=dtype)
+
+    def write(self, frames: np.ndarray) -> None:
+        """Copy frames in, overwriting the oldest ones once the buffer is full.
+
+        :param frames: Array of shape (n, channels)
+        """
+        if len(frames) > self.capacity:
+            self.written += len(frames) - self.capacity
+            frames = frames[-self.capacity:]
+        start = self.written % self.capacity
+        first = min(len(frames), self.capacity - start)
+        self._data[start:start + first] = frames[:first]
+        self._data[:len(frames) - first] = frames[first:]
+        self.written += len(frames)
+
+    def oldest(self) -> int:
+        """Absolute index of the oldest frame still held by the buffer."""
+        return max(0, self.written - self.capacity)
+
+    def views(self, start: int, stop: int) -> list:
+        """Zero-copy views of frames [start, stop) in absolute frame indices.
+        Returns two views when the range wraps around the end of the buffer.
+
+        :param start: First absolute frame index, must not be older than oldest()
+        :param stop: Absolute frame index to stop before, at most written
+        """
+        begin = start % self.capacity
+        count = stop - start
+        if begin + count <= self.capacity:
+            return [self._data[begin:begin + count]]
+        return [self._data[begin:], self._data[:count - (self.capacity - begin)]]
+
+
+class EnergyVAD:
+    """Energy based end-of-speech detector. Speech starts when a chunk's RMS
+    rises above the threshold and ends after `silence_duration` seconds of
+    chunks below it.
+
+    Attributes:
+        - rate: Sample rate of the audio
+        - threshold: RMS, as a fraction of full scale, that counts as speech
+        - silence_duration: Seconds of silence after speech that end it
+        - min_speech_duration: Seconds of speech needed before silence can end it
+    """
+    def __init__(self, rate: int, threshold: float = 0.02, silence_duration: float = 0.8,
+                 min_speech_duration: float = 0.3) -> None:
+        self.rate = rate
+        self.threshold = threshold
+        self.silence_duration = silence_duration
+        self.min_speech_duration = min_speech_duration
+        self.reset()
+
+    def reset(self) -> None:
+        self.speech_frames = 0
+        self.silence_frames = 0
+
+    @staticmethod
+    def rms(frames: np.ndarray) -> float:
+        """RMS of a chunk as a fraction of the dtype's full scale."""
+        if not len(frames):
+            return 0.0
+        samples = frames.astype(np.float32)
+        if np.issubdtype(frames.dtype, np.integer):
+            samples /= np.iinfo(frames.dtype).max
+        return float(np.sqrt(np.mean(np.square(samples))))
+
+    def update(self, frames: np.ndarray) -> bool:
+        """Feed the next chunk and return True once speech has ended.
+
+        :param frames: Array of shape (n, channels)
+        """
+        if self.rms(frames) >= self.threshold:
+            self.speech_frames += len(frames)
+            self.silence_frames = 0
+        elif self.speech_frames:
+            self.silence_frames += len(frames)
+        return (self.speech_frames >= self.min_speech_duration * self.rate
+                and self.silence_frames >= self.silence_duration * self.rate)
+
+
+class SyntheticStream:
+    """Stands in for a pyaudio input stream: pushes pre-generated samples
+    through the recorder callback from a background thread, so
+    CallbackRecorder can be exercised without an audio device.
+
+    Attributes:
+        - samples: Array of shape (n, channels) to play into the callback
+        - realtime: Pace chunks at the stream rate instead of as fast as possible
+    """
+    def __init__(self, samples: np.ndarray, stream_params: StreamParams, callback: Callable,
+                 realtime: bool = False) -> None:
+        self.samples = samples
+        self.stream_params = stream_params
+        self.callback = callback
+        self.realtime = realtime
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._active = False
+
+    def _run(self) -> None:
+        chunk = self.stream_params.frames_per_buffer
+        for start in range(0, len(self.samples), chunk):
+            if not self._active:
+                return
+            _, flag = self.callback(self.samples[start:start + chunk].tobytes(), chunk, None, 0)
+            if flag != pyaudio.paContinue:
+                break
+            if self.realtime:
+                time.sleep(chunk / self.stream_params.rate)
+        self._active = False
+
+    def start_stream(self) -> None:
+        self._active = True
+        self._thread.start()
+
+    def is_active(self) -> bool:
+        return self._active
+
+    def stop_stream(self) -> None:
+        self._active = False
+
+    def close(self) -> None:
+        self._active = False
+        if self._thread.is_alive() and self._thread is not threading.current_thread():
+            self._thread.join()
+
+
+class CallbackRecorder:
+    """CallbackRecorder uses pyaudio's callback mode to record sound from mic
+    into a preallocated ring buffer, optionally stopping on its own when the
+    speaker stops talking. Frames can be consumed while recording, either
+    with the `frames` generator or by iterating asynchronously.
+
+    Attributes:
+        - stream_params: StreamParams object with values for pyaudio Stream
+            object
+        - buffer_seconds: Seconds of audio the ring buffer holds
+        - vad: Optional EnergyVAD; recording stops once it detects end of speech
+        - stream_factory: Callable taking the recorder callback and returning
+            a started-able stream; defaults to a pyaudio input stream
+    """
+    def __init__(self, stream_params: StreamParams, buffer_seconds: float = 30.0,
+                 vad: Optional[EnergyVAD] = None, stream_factory: Optional[Callable] = None) -> None:
+        self.stream_params = stream_params
+        self.vad = vad
+        self.stream_factory = stream_factory or self._open_pyaudio_stream
+        self.buffer = RingBuffer(int(buffer_seconds * stream_params.rate), stream_params.channels,
+                                 stream_params.dtype)
+        self.dropped_frames = 0
+        self._pyaudio = None
+        self._stream = None
+        self._deadline_frames = None
+        self._start_frame = 0
+        self._finished = threading.Event()
+        self._condition = threading.Condition()
+
+    def _open_pyaudio_stream(self, callback: Callable):
+        self._pyaudio = pyaudio.PyAudio()
+        return self._pyaudio.open(**self.stream_params.to_dict(), stream_callback=callback,
+                                  start=False)
+
+    def _callback(self, in_data: bytes, frame_count: int, time_info, status):
+        frames = np.frombuffer(in_data, dtype=self.stream_params.dtype).reshape(
+            -1, self.stream_params.channels)
+        with self._condition:
+            self.buffer.write(frames)
+            done = self.vad is not None and self.vad.update(frames)
+            if self._deadline_frames is not None and self.buffer.written >= self._deadline_frames:
+                done = True
+            if done:
+                self._finished.set()
+            self._condition.notify_all()
+        return None, pyaudio.paComplete if done else pyaudio.paContinue
+
+    def feed(self, in_data: bytes) -> bool:
+        """Push raw samples through the recorder as if the device delivered
+        them. Returns True once recording has finished.
+
+        :param in_data: Interleaved samples in the stream format
+        """
+        frame_count = len(in_data) // (self.stream_params.channels * self.stream_params.dtype.itemsize)
+        _, flag = self._callback(in_data, frame_count, None, 0)
+        return flag == pyaudio.paComplete
+
+    def start(self, max_duration: Optional[float] = None) -> None:
+        """Start recording in the background.
+
+        :param max_duration: Stop after this many seconds even without end of speech
+        """
+        self._finished.clear()
+        self._start_frame = self.buffer.written
+        if self.vad is not None:
+            self.vad.reset()
+        self._deadline_frames = (self.buffer.written + int(max_duration * self.stream_params.rate)
+                                 if max_duration else None)
+        self._stream = self.stream_factory(self._callback)
+        self._stream.start_stream()
+
+    def stop(self) -> None:
+        """Stop recording and release the audio device."""
+        with self._condition:
+            self._finished.set()
+            self._condition.notify_all()
+        if self._stream is not None:
+            self._stream.stop_stream()
+            self._stream.close()
+            self._stream = None
+        if self._pyaudio is not None:
+            self._pyaudio.terminate()
+            self._pyaudio = None
+
+    @property
+    def finished(self) -> bool:
+        return self._finished.is_set()
+
+    def frames(self, start: Optional[int] = None, timeout: float = 1.0) -> Iterator[np.ndarray]:
+        """Yield zero-copy views of recorded frames as they arrive, until
+        recording finishes and everything has been consumed. Each view must be
+        used (or copied) before the ring buffer wraps around to it.
+
+        :param start: Absolute frame index to start from, defaults to the start of the
+            current recording
+        :param timeout: Seconds to wait for new frames before checking the stream again
+        """
+        position = self._start_frame if start is None else start
+        while True:
+            with self._condition:
+                while self.buffer.written == position and not self.finished:
+                    if not self._condition.wait(timeout) and (self._stream is None or not self._stream.is_active()):
+                        self._finished.set()
+                written = self.buffer.written
+                if position < self.buffer.oldest():
+                    self.dropped_frames += self.buffer.oldest() - position
+                    position = self.buffer.oldest()
+                views = self.buffer.views(position, written) if written > position else []
+            for view in views:
+                yield view
+            position = written
+            if self.finished and position == self.buffer.written:
+                return
+
+    async def _aiter(self, start: Optional[int]):
+        loop = asyncio.get_running_loop()
+        iterator = self.frames(start)
+        sentinel = object()
+        while True:
+            chunk = await loop.run_in_executor(None, next, iterator, sentinel)
+            if chunk is sentinel:
+                return
+            yield chunk
+
+    def __aiter__(self):
+        return self._aiter(None)
+
+    def record(self, save_path: str, max_duration: Optional[float] = None) -> None:
+        """Record sound from mic until end of speech or `max_duration`
+        seconds, streaming frames into a wav file as they arrive.
+
+        :param save_path: Where to store recording
+        :param max_duration: Upper bound on the recording length in seconds
+        """
+        print("Start recording...")
+        self.start(max_duration)
+        try:
+            with wave.open(save_path, "wb") as wav_file:
+                wav_file.setnchannels(self.stream_params.channels)
+                wav_file.setsampwidth(self.stream_params.dtype.itemsize)
+                wav_file.setframerate(self.stream_params.rate)
+                for chunk in self.frames():
+                    wav_file.writeframes(memoryview(chunk).cast("B"))
+        finally:
+            self.stop()
+        print("Stop recording")
+
+
 if __name__ == "__main__":
     stream_params = StreamParams()
     recorder = Recorder(stream_params)